@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional, Set, Any, Dict
+from typing import Optional, Set, Any, Dict, Tuple
 
 from fastapi import Header, HTTPException, status, Request
 
@@ -78,6 +82,57 @@ def _get_supabase_claims(token: str) -> Optional[Dict[str, Any]]:
     return None
 
 
+# Supabase principal cache: blake2b(token) -> (monotonic expiry, Principal).
+# Keyed by a digest so raw tokens are not kept in memory. Entries never outlive
+# the token's own exp claim, and only tokens that carry one are cached: claims
+# from the get_user fallback have no exp, so a revoked token would otherwise
+# keep working for the full TTL.
+# LRU-bounded so overflow evicts one cold session instead of all of them.
+# Sync dependencies run in the threadpool, hence the lock.
+_PRINCIPAL_CACHE_TTL_SEC = float(os.getenv("PRINCIPAL_CACHE_TTL_SEC", "60"))
+_PRINCIPAL_CACHE_MAX = 4096
+_PRINCIPAL_EXP_SKEW_SEC = 5.0
+_PRINCIPAL_CACHE: "OrderedDict[bytes, Tuple[float, Principal]]" = OrderedDict()
+_PRINCIPAL_CACHE_LOCK = threading.Lock()
+
+
+def _token_digest(token: str) -> bytes:
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+
+def _get_supabase_principal(token: str) -> Optional[Principal]:
+    """Resolve a bearer token to a supabase Principal, cached for a short TTL."""
+    key = _token_digest(token)
+    now = time.monotonic()
+    with _PRINCIPAL_CACHE_LOCK:
+        hit = _PRINCIPAL_CACHE.get(key)
+        if hit is not None:
+            if now < hit[0]:
+                _PRINCIPAL_CACHE.move_to_end(key)
+                return hit[1]
+            del _PRINCIPAL_CACHE[key]
+
+    claims = _get_supabase_claims(token)
+    if not claims:
+        return None
+    subject = str(claims.get("sub") or claims.get("user_id") or "")
+    if not subject:
+        return None
+    principal = Principal(scheme="supabase", subject=subject, claims=claims, is_pro=is_pro_user(subject))
+
+    exp = claims.get("exp")
+    if not isinstance(exp, (int, float)):
+        return principal
+    ttl = min(_PRINCIPAL_CACHE_TTL_SEC, exp - time.time() - _PRINCIPAL_EXP_SKEW_SEC)
+    if ttl > 0:
+        with _PRINCIPAL_CACHE_LOCK:
+            _PRINCIPAL_CACHE[key] = (now + ttl, principal)
+            _PRINCIPAL_CACHE.move_to_end(key)
+            while len(_PRINCIPAL_CACHE) > _PRINCIPAL_CACHE_MAX:
+                _PRINCIPAL_CACHE.popitem(last=False)
+    return principal
+
+
 def get_principal_from_request(
     request: Request,
     authorization: Optional[str] = None,
@@ -87,11 +142,9 @@ def get_principal_from_request(
     if not token:
         token = request.query_params.get("access_token")
     if token:
-        claims = _get_supabase_claims(token)
-        if claims:
-            subject = str(claims.get("sub") or claims.get("user_id") or "")
-            if subject:
-                return Principal(scheme="supabase", subject=subject, claims=claims, is_pro=is_pro_user(subject))
+        principal = _get_supabase_principal(token)
+        if principal is not None:
+            return principal
     keys = get_configured_api_keys()
     if x_api_key and x_api_key in keys:
         return get_principal(x_api_key)
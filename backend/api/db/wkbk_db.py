@@ -18,13 +18,15 @@ wkbk_articles.jsonl (shogi-extend 由来) への読み取り専用アクセス
 
 from __future__ import annotations
 
-import json
 import logging
+import mmap
 import os
 import re
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from backend.api.utils import fast_json
 
 _LOG = logging.getLogger("uvicorn.error")
 
@@ -53,6 +55,30 @@ def _get_explanations_path() -> Path:
     return Path(env) if env else _DEFAULT_EXPLANATIONS_PATH
 
 
+def _iter_jsonl_lines(path: Path) -> Iterator[Tuple[int, bytes]]:
+    """
+    JSONL ファイルを mmap して (行番号, 行バイト列) を順に返す。
+    str へのデコードは JSON パーサに任せ、Python 側のバッファリングを避ける。
+    空行はスキップする。
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            prev = 0
+            lineno = 0
+            while prev < size:
+                nl = mm.find(b"\n", prev)
+                if nl < 0:
+                    nl = size
+                lineno += 1
+                line = mm[prev:nl].strip()
+                prev = nl + 1
+                if line:
+                    yield lineno, line
+
+
 # ---------------------------------------------------------------------------
 # lineage_key → 表示ヒント（著作権に配慮した言い換え）
 # ---------------------------------------------------------------------------
@@ -154,52 +180,48 @@ def _load() -> None:
     index: Dict[str, _ArticleEntry] = {}
 
     try:
-        with articles_path.open("r", encoding="utf-8") as f:
-            for lineno, line in enumerate(f, 1):
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    obj = json.loads(line)
-                except json.JSONDecodeError as e:
-                    _LOG.debug("[wkbk_db] JSON parse error at line %d: %s", lineno, e)
-                    skipped += 1
-                    continue
-
-                key = (obj.get("key") or "").strip()
-                sfen_full = (obj.get("init_sfen") or "").strip()
-                if not key or not sfen_full:
-                    skipped += 1
-                    continue
-
-                sfen_norm = normalize_sfen(sfen_full)
-                tags = [str(t) for t in (obj.get("tag_list") or [])]
-                lineage_key = str(obj.get("lineage_key") or "")
-                difficulty = obj.get("difficulty")
-                if isinstance(difficulty, (int, float)):
-                    difficulty = int(difficulty)
-                else:
-                    difficulty = None
-                author = (obj.get("user") or {}).get("name") or None
-                if author:
-                    author = str(author).strip() or None
-                description = str(obj.get("description") or "").strip()
-                short_note = _make_short_note(description)
-
-                entry = _ArticleEntry(
-                    key=key,
-                    lineage_key=lineage_key,
-                    tags=tags,
-                    difficulty=difficulty,
-                    author=author,
-                    short_note=short_note,
-                    sfen_norm=sfen_norm,
-                    sfen_full=sfen_full,
-                )
-                # 重複 SFEN は最初のエントリを優先（実際にはほぼない）
-                if sfen_norm not in index:
-                    index[sfen_norm] = entry
-                count += 1
+        for lineno, line in _iter_jsonl_lines(articles_path):
+            try:
+                obj = fast_json.loads(line)
+            except ValueError as e:
+                _LOG.debug("[wkbk_db] JSON parse error at line %d: %s", lineno, e)
+                skipped += 1
+                continue
+
+            key = (obj.get("key") or "").strip()
+            sfen_full = (obj.get("init_sfen") or "").strip()
+            if not key or not sfen_full:
+                skipped += 1
+                continue
+
+            sfen_norm = normalize_sfen(sfen_full)
+            tags = [str(t) for t in (obj.get("tag_list") or [])]
+            lineage_key = str(obj.get("lineage_key") or "")
+            difficulty = obj.get("difficulty")
+            if isinstance(difficulty, (int, float)):
+                difficulty = int(difficulty)
+            else:
+                difficulty = None
+            author = (obj.get("user") or {}).get("name") or None
+            if author:
+                author = str(author).strip() or None
+            description = str(obj.get("description") or "").strip()
+            short_note = _make_short_note(description)
+
+            entry = _ArticleEntry(
+                key=key,
+                lineage_key=lineage_key,
+                tags=tags,
+                difficulty=difficulty,
+                author=author,
+                short_note=short_note,
+                sfen_norm=sfen_norm,
+                sfen_full=sfen_full,
+            )
+            # 重複 SFEN は最初のエントリを優先（実際にはほぼない）
+            if sfen_norm not in index:
+                index[sfen_norm] = entry
+            count += 1
 
     except Exception as e:
         _LOG.warning("[wkbk_db] failed to load articles: %s", e)
@@ -221,20 +243,16 @@ def _load_explanations() -> None:
         return
     try:
         goals: Dict[str, str] = {}
-        with exp_path.open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    obj = json.loads(line)
-                    key = (obj.get("key") or "").strip()
-                    goal = (obj.get("goal") or "").strip()
-                    if key and goal:
-                        # 短く切って著作権リスクを抑える（最大50文字）
-                        goals[key] = goal[:50]
-                except Exception:
-                    continue
+        for _lineno, line in _iter_jsonl_lines(exp_path):
+            try:
+                obj = fast_json.loads(line)
+                key = (obj.get("key") or "").strip()
+                goal = (obj.get("goal") or "").strip()
+                if key and goal:
+                    # 短く切って著作権リスクを抑える（最大50文字）
+                    goals[key] = goal[:50]
+            except Exception:
+                continue
         _EXPLANATIONS_GOALS = goals
         _LOG.info("[wkbk_db] loaded %d explanation goals.", len(goals))
     except Exception as e:
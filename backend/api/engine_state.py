@@ -5,50 +5,179 @@ Extracted from main.py to allow routers to import without circular deps.
 """
 from __future__ import annotations
 import asyncio
+import contextlib
+from collections import deque
+import heapq
+from itertools import accumulate
 import json
+import logging
 import os
-import re
-import time
-from typing import Optional, Dict, Any, List, AsyncGenerator
+from typing import Optional, Deque, Dict, Any, List, AsyncGenerator, Tuple
+
+from backend.api.utils import fast_json
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+
+_LOG = logging.getLogger("uvicorn.error")
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(os.getenv(key, str(default)) or str(default))
+    except Exception:
+        return default
+
 
 # ====== 設定 ======
 USI_CMD = os.getenv("USI_CMD", "/usr/local/bin/yaneuraou")
 ENGINE_WORK_DIR = os.getenv("ENGINE_WORK_DIR", "/usr/local/bin")
 EVAL_DIR = os.getenv("EVAL_DIR", "/usr/local/bin/eval")
+# /api/analysis/batch で並列に使うエンジンプロセス数 (1 なら従来どおり単一プロセス)
+BATCH_ENGINES = _env_int("BATCH_ENGINES", 1)
 
 SCORE_SCALE = 0.7
 
+
 USI_BOOT_TIMEOUT = 10.0
 USI_GO_TIMEOUT = 20.0
 
+# エンジン stdout/stderr のパイプ容量 (既定 64KiB)。MultiPV の info 行が溜まっても
+# エンジン側の write がブロックしにくいよう広げる (Linux 2.6.35+ の F_SETPIPE_SZ)
+_PIPE_SIZE = 1 << 20
+
+# analyze_many が1回のロック保持で解析する局面数
+_ANALYZE_MANY_CHUNK = 16
+
+# NDJSON 行の末尾パディング（プロキシのバッファリング対策で各行を 4KB 以上にする）
+_NDJSON_PAD = b" " * 4096
+
 # Set by main.py lifespan so _EngineAdapter can schedule coroutines
 _MAIN_LOOP: Optional[asyncio.AbstractEventLoop] = None
 
 
+def _single_spaced(s: str) -> bool:
+    return s.isascii() and s.isprintable() and "  " not in s
+
+
 def is_gote_turn(position_cmd: str) -> bool:
+    # split() でトークンのリストを作らず、find と空白の数え上げだけで判定する。
+    # 区切りが単一の半角空白でない入力 (連続空白・タブ・全角空白など) だけ split() に戻す
     if "startpos" in position_cmd:
-        if "moves" not in position_cmd:
+        idx = position_cmd.find("moves")
+        if idx < 0:
             return False
-        moves_part = position_cmd.split("moves")[1].strip()
-        if not moves_part:
+        end = position_cmd.find("moves", idx + 5)
+        tail = position_cmd[idx + 5:end if end >= 0 else None].strip()
+        if not tail:
             return False
-        moves = moves_part.split()
-        return len(moves) % 2 != 0
+        if not _single_spaced(tail):
+            return len(tail.split()) % 2 != 0
+        return tail.count(" ") % 2 == 0
     if "sfen" in position_cmd:
-        parts = position_cmd.split()
-        try:
-            sfen_index = parts.index("sfen")
-            turn = parts[sfen_index + 2]
-            return turn == "w"
-        except Exception:
+        if not _single_spaced(position_cmd):
+            parts = position_cmd.split()
+            try:
+                return parts[parts.index("sfen") + 2] == "w"
+            except (ValueError, IndexError):
+                return False
+        if position_cmd.startswith("sfen "):
+            idx = 0
+        else:
+            idx = position_cmd.find(" sfen ")
+            if idx < 0:
+                return False
+            idx += 1
+        board_end = position_cmd.find(" ", idx + 5)
+        if board_end < 0:
             return False
+        turn_end = position_cmd.find(" ", board_end + 1)
+        turn = position_cmd[board_end + 1:] if turn_end < 0 else position_cmd[board_end + 1:turn_end]
+        return turn == "w"
     return False
 
 
+def parse_usi_info(line: str) -> Optional[Dict[str, Any]]:
+    """USI info 行から multipv / score / pv を取り出す。score が無ければ None。"""
+    if "score" not in line or "pv" not in line:
+        return None
+    try:
+        # 正規表現を使わず、空白区切りのトークンを先頭から1回だけ走査する
+        toks = line.split()
+        n = len(toks)
+        data: Dict[str, Any] = {"multipv": 1}
+        score: Optional[Dict[str, Any]] = None
+        pv: Optional[str] = None
+        i = 0
+        while i < n:
+            tok = toks[i]
+            if tok == "multipv" and i + 1 < n and toks[i + 1].isdigit():
+                data["multipv"] = int(toks[i + 1])
+                i += 2
+                continue
+            if tok == "score" and score is None and i + 2 < n:
+                kind = toks[i + 1]
+                j = i + 2
+                if toks[j] in ("lowerbound", "upperbound"):
+                    j += 1
+                if kind in ("cp", "mate") and j < n:
+                    val = int(toks[j])
+                    if kind == "cp":
+                        val = int(val * SCORE_SCALE)
+                    score = {"type": kind, kind: val}
+                    i = j + 1
+                    continue
+            elif tok == "pv":
+                # pv は行末まで続く
+                if i + 1 < n:
+                    pv = " ".join(toks[i + 1:])
+                break
+            i += 1
+        if score is None:
+            return None
+        data["score"] = score
+        if pv is not None:
+            data["pv"] = pv
+        return data
+    except Exception:
+        return None
+
+
+def _negate_scores(cands: List[Dict[str, Any]]) -> None:
+    """後手番局面の評価値を先手視点に反転する (in-place)。"""
+    for item in cands:
+        if "score" in item:
+            s = item["score"]
+            if s["type"] == "cp":
+                s["cp"] = -s["cp"]
+            elif s["type"] == "mate":
+                s["mate"] = -s["mate"]
+
+
+def _set_pipe_size(fd: int, name: str) -> None:
+    """パイプ容量を _PIPE_SIZE に広げる。非対応環境や上限超過では既定のまま動かす。"""
+    setpipe = getattr(fcntl, "F_SETPIPE_SZ", None)
+    if setpipe is None:
+        return
+    try:
+        fcntl.fcntl(fd, setpipe, _PIPE_SIZE)
+    except (OSError, ValueError, AttributeError) as e:
+        # /proc/sys/fs/pipe-max-size を超える場合など
+        _LOG.debug("[%s] F_SETPIPE_SZ failed: %s", name, e)
+
+
 class BaseEngine:
     def __init__(self, name: str = "Engine"):
         self.proc: Optional[asyncio.subprocess.Process] = None
         self.name = name
+        # stdout から読み出し済みでまだ消費していない行と、改行前の末尾断片
+        self._pending: Deque[str] = deque()
+        self._tail = bytearray()
+        self._stdout: Optional[asyncio.StreamReader] = None
+        self._stderr: Optional[asyncio.StreamReader] = None
+        self._pipe_transports: List[asyncio.ReadTransport] = []
 
     async def _send_line(self, s: str) -> None:
         if self.proc and self.proc.stdin:
@@ -56,64 +185,165 @@ class BaseEngine:
                 self.proc.stdin.write((s + "\n").encode())
                 await self.proc.stdin.drain()
             except Exception as e:
-                print(f"[{self.name}] Send Error: {e}")
+                _LOG.warning("[%s] Send Error: %s", self.name, e)
+
+    async def _send_lines(self, lines: List[str]) -> None:
+        """続けて送るコマンドを1回の write と1回の drain でまとめて送る。"""
+        if self.proc and self.proc.stdin:
+            try:
+                self.proc.stdin.write(("\n".join(lines) + "\n").encode())
+                await self.proc.stdin.drain()
+            except Exception as e:
+                _LOG.warning("[%s] Send Error: %s", self.name, e)
+
+    def _reset_stdout_buffer(self) -> None:
+        self._pending.clear()
+        self._tail = bytearray()
+
+    def _push_chunk(self, chunk: bytes) -> None:
+        """読み出したチャンクを行に分割して _pending に積む。改行前の断片は _tail に残す。"""
+        # 追記・先頭削除とも bytearray 上で行い、断片が長くても毎回コピーし直さない
+        self._tail += chunk
+        end = self._tail.rfind(b"\n")
+        if end < 0:
+            return
+        complete = self._tail[:end]
+        del self._tail[:end + 1]
+        for raw in complete.split(b"\n"):
+            line = raw.decode(errors="ignore").strip()
+            if (
+                line
+                and (line.startswith("bestmove") or line.startswith("checkmate"))
+                and _LOG.isEnabledFor(logging.INFO)
+            ):
+                _LOG.info("[%s] <<< %s", self.name, line)
+            self._pending.append(line)
+
+    async def _fill_pending(self, timeout: float) -> bool:
+        """完全な行が1つ以上そろうまで stdout を読む。タイムアウト・EOF なら False。"""
+        if not self.proc or self._stdout is None:
+            return False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not self._pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                # StreamReader のバッファにある分をまとめて取り出す (1行ずつ起床しない)
+                chunk = await asyncio.wait_for(self._stdout.read(65536), timeout=remaining)
+            except asyncio.TimeoutError:
+                return False
+            if not chunk:
+                # EOF: 改行のない最終行があれば返してから終了
+                if self._tail:
+                    self._push_chunk(b"\n")
+                    return True
+                return False
+            self._push_chunk(chunk)
+        return True
+
+    async def _spawn(self) -> None:
+        """
+        エンジンを起動する。stdout/stderr は自前の os.pipe() を容量 _PIPE_SIZE に広げてから
+        子プロセスに渡し、親側の読み口を StreamReader につなぐ。asyncio の PIPE では
+        イベントループ実装 (uvloop など) によってパイプの fd を取り出せないため。
+        """
+        self._close_pipes()
+        loop = asyncio.get_running_loop()
+        read_fds: List[int] = []
+        write_fds: List[int] = []
+        try:
+            for _ in range(2):
+                r, w = os.pipe()
+                read_fds.append(r)
+                write_fds.append(w)
+                _set_pipe_size(w, self.name)
+            self.proc = await asyncio.create_subprocess_exec(
+                USI_CMD,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=write_fds[0],
+                stderr=write_fds[1],
+                cwd=ENGINE_WORK_DIR,
+            )
+        except BaseException:
+            for fd in read_fds:
+                os.close(fd)
+            raise
+        finally:
+            # 書き込み側は子プロセスだけが持つ (親が持つと EOF が届かない)
+            for fd in write_fds:
+                os.close(fd)
+        readers: List[asyncio.StreamReader] = []
+        for fd in read_fds:
+            reader = asyncio.StreamReader(limit=_PIPE_SIZE)
+            transport, _ = await loop.connect_read_pipe(
+                lambda reader=reader: asyncio.StreamReaderProtocol(reader), os.fdopen(fd, "rb", 0)
+            )
+            self._pipe_transports.append(transport)
+            readers.append(reader)
+        self._stdout, self._stderr = readers
+
+    async def shutdown(self, timeout: float = 2.0) -> None:
+        """quit を送って終了を待ち、応答がなければ kill する。"""
+        proc, self.proc = self.proc, None
+        if proc and proc.returncode is None:
+            try:
+                if proc.stdin:
+                    proc.stdin.write(b"quit\n")
+                    await proc.stdin.drain()
+                await asyncio.wait_for(proc.wait(), timeout)
+            except Exception:
+                with contextlib.suppress(ProcessLookupError):
+                    proc.kill()
+                await proc.wait()
+        self._close_pipes()
+        self._reset_stdout_buffer()
+
+    def _close_pipes(self) -> None:
+        for transport in self._pipe_transports:
+            transport.close()
+        self._pipe_transports = []
+        self._stdout = None
+        self._stderr = None
 
     async def _read_line(self, timeout: float = 0.5) -> Optional[str]:
-        if not self.proc or not self.proc.stdout:
+        if not self._pending and not await self._fill_pending(timeout):
             return None
-        try:
-            line_bytes = await asyncio.wait_for(self.proc.stdout.readline(), timeout=timeout)
-            if not line_bytes:
-                return None
-            line = line_bytes.decode(errors="ignore").strip()
-            if line and (line.startswith("bestmove") or line.startswith("checkmate")):
-                print(f"[{self.name}] <<< {line}")
-            return line
-        except asyncio.TimeoutError:
+        return self._pending.popleft()
+
+    async def _read_available(self, timeout: float = 0.5) -> Optional[List[str]]:
+        """読み出し済みの行をすべて返す。無ければ1行以上届くまで待つ。タイムアウト・EOF なら None。"""
+        if not self._pending and not await self._fill_pending(timeout):
             return None
+        lines = list(self._pending)
+        self._pending.clear()
+        return lines
+
+    def _unread(self, lines: List[str]) -> None:
+        """_read_available で受け取ったが処理しなかった行を先頭に戻す。"""
+        self._pending.extendleft(reversed(lines))
 
     async def _wait_until(self, pred, timeout: float) -> None:
-        end = time.time() + timeout
-        while time.time() < end:
+        loop = asyncio.get_running_loop()
+        end = loop.time() + timeout
+        while loop.time() < end:
             line = await self._read_line(timeout=0.5)
             if line and pred(line):
                 break
 
     async def _log_stderr(self) -> None:
-        if self.proc and self.proc.stderr:
+        if self.proc and self._stderr is not None:
             try:
-                data = await self.proc.stderr.read()
+                data = await self._stderr.read()
                 if data:
                     msg = data.decode(errors="ignore").strip()
-                    print(f"[{self.name}] [STDERR] {msg}")
+                    _LOG.warning("[%s] [STDERR] %s", self.name, msg)
             except Exception:
                 pass
 
     def parse_usi_info(self, line: str) -> Optional[Dict[str, Any]]:
-        if "score" not in line or "pv" not in line:
-            return None
-        try:
-            data: Dict[str, Any] = {"multipv": 1}
-            mp = re.search(r"multipv\s+(\d+)", line)
-            if mp:
-                data["multipv"] = int(mp.group(1))
-            sc = re.search(
-                r"score\s+(cp|mate)\s+(?:lowerbound\s+|upperbound\s+)?([\+\-]?\d+)", line
-            )
-            if sc:
-                kind = sc.group(1)
-                val = int(sc.group(2))
-                if kind == "cp":
-                    val = int(val * SCORE_SCALE)
-                data["score"] = {"type": kind, ("cp" if kind == "cp" else "mate"): val}
-            else:
-                return None
-            pv = re.search(r" pv\s+(.*)", line)
-            if pv:
-                data["pv"] = pv.group(1).strip()
-            return data
-        except Exception:
-            return None
+        return parse_usi_info(line)
 
 
 class EngineState(BaseEngine):
@@ -125,31 +355,23 @@ class EngineState(BaseEngine):
     async def ensure_alive(self) -> None:
         if self.proc and self.proc.returncode is None:
             return
-        print(f"[{self.name}] Starting: {USI_CMD}")
+        _LOG.info("[%s] Starting: %s", self.name, USI_CMD)
+        self._reset_stdout_buffer()
         try:
-            self.proc = await asyncio.create_subprocess_exec(
-                USI_CMD,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=ENGINE_WORK_DIR,
-            )
+            await self._spawn()
             await self._send_line("usi")
             await self._wait_until(lambda l: "usiok" in l, USI_BOOT_TIMEOUT)
-            await self._send_line("setoption name Threads value 1")
-            await self._send_line("setoption name USI_Hash value 64")
+            setup = ["setoption name Threads value 1", "setoption name USI_Hash value 64"]
             if os.path.exists(EVAL_DIR):
-                await self._send_line(f"setoption name EvalDir value {EVAL_DIR}")
-            await self._send_line("setoption name OwnBook value false")
-            await self._send_line("setoption name MultiPV value 3")
-            await self._send_line("isready")
+                setup.append(f"setoption name EvalDir value {EVAL_DIR}")
+            setup += ["setoption name OwnBook value false", "setoption name MultiPV value 3", "isready"]
+            await self._send_lines(setup)
             await self._wait_until(lambda l: "readyok" in l, USI_BOOT_TIMEOUT)
-            await self._send_line("usinewgame")
-            await self._send_line("isready")
+            await self._send_lines(["usinewgame", "isready"])
             await self._wait_until(lambda l: "readyok" in l, 5.0)
-            print(f"[{self.name}] Ready")
+            _LOG.info("[%s] Ready", self.name)
         except Exception as e:
-            print(f"[{self.name}] Start Failed: {e}")
+            _LOG.error("[%s] Start Failed: %s", self.name, e)
             await self._log_stderr()
             self.proc = None
 
@@ -157,8 +379,9 @@ class EngineState(BaseEngine):
         if not self.proc:
             return
         await self._send_line("stop")
-        end_time = time.time() + 0.5
-        while time.time() < end_time:
+        loop = asyncio.get_running_loop()
+        end_time = loop.time() + 0.5
+        while loop.time() < end_time:
             line = await self._read_line(timeout=0.1)
             if not line:
                 continue
@@ -183,36 +406,41 @@ class EngineState(BaseEngine):
                 if req.position.startswith("position")
                 else f"position {req.position}"
             )
-            await self._send_line(pos_cmd)
             is_gote = is_gote_turn(pos_cmd)
-            await self._send_line(f"go depth {req.depth} multipv {req.multipv}")
+            await self._send_lines([pos_cmd, f"go depth {req.depth} multipv {req.multipv}"])
             while True:
                 if self.cancel_event.is_set():
                     self.cancel_event.clear()
                     await self.stop_and_flush()
                     break
-                line = await self._read_line(timeout=2.0)
-                if line is None:
+                lines = await self._read_available(timeout=2.0)
+                if lines is None:
                     yield ": keepalive\n\n"
                     if self.proc and self.proc.returncode is not None:
                         break
                     continue
-                if not line:
-                    break
-                if line.startswith("bestmove"):
-                    parts = line.split()
-                    if len(parts) > 1:
-                        yield f"data: {json.dumps({'bestmove': parts[1]})}\n\n"
+                finished = False
+                for idx, line in enumerate(lines):
+                    if not line or line.startswith("bestmove"):
+                        finished = True
+                        # 終了行より後に届いていた行は次の読み出しに回す
+                        self._unread(lines[idx + 1:])
+                        if line:
+                            parts = line.split()
+                            if len(parts) > 1:
+                                yield f"data: {json.dumps({'bestmove': parts[1]})}\n\n"
+                        break
+                    info = self.parse_usi_info(line)
+                    if info:
+                        if is_gote and "score" in info:
+                            s = info["score"]
+                            if s["type"] == "cp":
+                                s["cp"] = -s["cp"]
+                            elif s["type"] == "mate":
+                                s["mate"] = -s["mate"]
+                        yield f"data: {json.dumps({'multipv_update': info})}\n\n"
+                if finished:
                     break
-                info = self.parse_usi_info(line)
-                if info:
-                    if is_gote and "score" in info:
-                        s = info["score"]
-                        if s["type"] == "cp":
-                            s["cp"] = -s["cp"]
-                        elif s["type"] == "mate":
-                            s["mate"] = -s["mate"]
-                    yield f"data: {json.dumps({'multipv_update': info})}\n\n"
 
     async def solve_tsume_hand(self, sfen: str) -> Dict[str, Any]:
         async with self.lock:
@@ -232,12 +460,12 @@ class EngineState(BaseEngine):
                 await self._wait_until(lambda l: "readyok" in l, 2.0)
             sfen_cmd = sfen if sfen.startswith("sfen") else f"sfen {sfen}"
             cmd = f"position {sfen_cmd}"
-            await self._send_line(cmd)
-            await self._send_line("go nodes 2000")
+            await self._send_lines([cmd, "go nodes 2000"])
             bestmove = None
             mate_found = False
-            start_time = time.time()
-            while time.time() - start_time < 5.0:
+            loop = asyncio.get_running_loop()
+            end_time = loop.time() + 5.0
+            while loop.time() < end_time:
                 line = await self._read_line(timeout=1.0)
                 if not line:
                     if self.proc.returncode is not None:
@@ -256,7 +484,7 @@ class EngineState(BaseEngine):
             if not bestmove:
                 await self.stop_and_flush()
                 return {"status": "error", "message": "Timeout"}
-            print(f"[{self.name}] Escape: {bestmove}, Mate: {mate_found}")
+            _LOG.info("[%s] Escape: %s, Mate: %s", self.name, bestmove, mate_found)
             if bestmove == "resign":
                 return {"status": "win", "bestmove": "resign", "message": "正解！詰みました！"}
             elif bestmove == "win":
@@ -269,18 +497,18 @@ class EngineState(BaseEngine):
 
 
 class BatchEngineState(EngineState):
-    def __init__(self) -> None:
-        super().__init__(name="BatchEngine")
+    def __init__(self, name: str = "BatchEngine") -> None:
+        super().__init__(name=name)
 
     async def fast_analyze_one(self, position_cmd: str) -> Dict[str, Any]:
         if not self.proc:
             return {"ok": False}
-        await self._send_line(position_cmd)
-        await self._send_line("go nodes 150000 multipv 1")
+        await self._send_lines([position_cmd, "go nodes 150000 multipv 1"])
         bestmove = None
         cands_map: Dict[int, Any] = {}
-        end_time = time.time() + 10.0
-        while time.time() < end_time:
+        loop = asyncio.get_running_loop()
+        end_time = loop.time() + 10.0
+        while loop.time() < end_time:
             line = await self._read_line(timeout=0.5)
             if not line:
                 continue
@@ -296,42 +524,155 @@ class BatchEngineState(EngineState):
         sorted_cands = sorted(cands_map.values(), key=lambda x: x["multipv"])
         return {"ok": bestmove is not None, "bestmove": bestmove, "multipv": sorted_cands}
 
+    async def analyze_many(self, position_cmds: List[str]) -> List[Dict[str, Any]]:
+        """
+        複数局面を _ANALYZE_MANY_CHUNK 件ずつ、ロック1回・flush1回で順に解析する。
+        チャンクの間でロックを手放すので、長い棋譜でも /api/analysis/batch を待たせ続けない。
+        """
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(position_cmds), _ANALYZE_MANY_CHUNK):
+            async with self.lock:
+                await self.ensure_alive()
+                await self.stop_and_flush()
+                for position_cmd in position_cmds[start:start + _ANALYZE_MANY_CHUNK]:
+                    results.append(await self.fast_analyze_one(position_cmd))
+        return results
+
     async def stream_batch_analyze(
         self, moves: List[str], time_budget_ms: int = None
-    ) -> AsyncGenerator[str, None]:
+    ) -> AsyncGenerator[bytes, None]:
         async with self.lock:
             self.cancel_event.clear()
             await self.ensure_alive()
             await self.stop_and_flush()
-            yield json.dumps({"status": "start"}) + (" " * 4096) + "\n"
-            start_time = time.time()
+            yield fast_json.dumps({"status": "start"}) + _NDJSON_PAD + b"\n"
+            loop = asyncio.get_running_loop()
+            budget_end = loop.time() + time_budget_ms / 1000 if time_budget_ms else None
+            pos_cmd = "position startpos"
             for i in range(len(moves) + 1):
                 if self.cancel_event.is_set():
                     self.cancel_event.clear()
                     await self.stop_and_flush()
                     break
-                if time_budget_ms and (time.time() - start_time > time_budget_ms / 1000):
-                    print(f"[{self.name}] Time budget exceeded at ply {i}")
+                if budget_end is not None and loop.time() > budget_end:
+                    _LOG.info("[%s] Time budget exceeded at ply %d", self.name, i)
                     break
-                pos_str = "startpos moves " + " ".join(moves[:i]) if i > 0 else "startpos"
-                pos_cmd = f"position {pos_str}"
+                # 手順は前の ply の文字列に1手ずつ足していく (毎回 join し直さない)。
+                # ply 間で usinewgame は送らないので置換表はそのまま次の局面に引き継がれる
+                if i == 1:
+                    pos_cmd += " moves " + moves[0]
+                elif i > 1:
+                    pos_cmd += " " + moves[i - 1]
                 res = await self.fast_analyze_one(pos_cmd)
                 if res["ok"]:
                     if i % 2 != 0:
-                        for item in res["multipv"]:
-                            if "score" in item:
-                                s = item["score"]
-                                if s["type"] == "cp":
-                                    s["cp"] = -s["cp"]
-                                elif s["type"] == "mate":
-                                    s["mate"] = -s["mate"]
-                    json_str = json.dumps({"ply": i, "result": res})
-                    yield json_str + (" " * 4096) + "\n"
+                        _negate_scores(res["multipv"])
+                    yield fast_json.dumps({"ply": i, "result": res}) + _NDJSON_PAD + b"\n"
                     await asyncio.sleep(0)
                 else:
-                    print(f"[{self.name}] Analysis failed at ply {i}")
+                    _LOG.warning("[%s] Analysis failed at ply %d", self.name, i)
+
+
+class BatchEnginePool:
+    """
+    /api/analysis/batch の各 ply を複数の BatchEngine プロセスで並列に解析する。
+    ply ごとの解析は互いに独立なので、空いたエンジンが次の ply を取りに行き、
+    結果は ply 順に並べ直してから流す。size が 1 なら primary をそのまま使う。
+    追加のエンジンは初回利用時に起動する (1プロセスあたり Threads 1 / USI_Hash 64MB)。
+    """
+
+    def __init__(self, primary: BatchEngineState, size: int):
+        self.primary = primary
+        self.size = max(1, size)
+        self._helpers: List[BatchEngineState] = []
+        self.cancel_event = asyncio.Event()
+
+    async def cancel_current(self) -> None:
+        self.cancel_event.set()
+        await self.primary.cancel_current()
+
+    async def close(self) -> None:
+        """追加で起動したエンジンを止める (lifespan の shutdown から呼ぶ)。"""
+        helpers, self._helpers = self._helpers, []
+        await asyncio.gather(*(e.shutdown() for e in helpers), return_exceptions=True)
+
+    def _engines(self, k: int) -> List[BatchEngineState]:
+        while len(self._helpers) < k - 1:
+            self._helpers.append(BatchEngineState(name=f"BatchEngine-{len(self._helpers) + 1}"))
+        return [self.primary] + self._helpers[: k - 1]
+
+    async def stream_batch_analyze(
+        self, moves: List[str], time_budget_ms: int = None
+    ) -> AsyncGenerator[bytes, None]:
+        k = min(self.size, len(moves) + 1)
+        if k <= 1:
+            async for line in self.primary.stream_batch_analyze(moves, time_budget_ms):
+                yield line
+            return
+
+        self.cancel_event.clear()
+        loop = asyncio.get_running_loop()
+        budget_end = loop.time() + time_budget_ms / 1000 if time_budget_ms else None
+        done_q: "asyncio.Queue[Optional[Tuple[int, Optional[Dict[str, Any]]]]]" = asyncio.Queue()
+        next_ply = iter(range(len(moves) + 1))
+        # ply ごとに moves[:i] を join し直すと手数の2乗になるので、局面コマンドは先に1回で作る
+        pos_cmds = ["position startpos"] + list(
+            accumulate(moves, lambda acc, m: acc + " " + m, initial="position startpos moves")
+        )[1:]
+
+        async def worker(engine: BatchEngineState) -> None:
+            try:
+                async with engine.lock:
+                    await engine.ensure_alive()
+                    if not engine.proc:
+                        return
+                    await engine.stop_and_flush()
+                    for i in next_ply:
+                        if self.cancel_event.is_set():
+                            break
+                        if budget_end is not None and loop.time() > budget_end:
+                            _LOG.info("[%s] Time budget exceeded at ply %d", engine.name, i)
+                            break
+                        try:
+                            res: Optional[Dict[str, Any]] = await engine.fast_analyze_one(pos_cmds[i])
+                        except Exception:
+                            _LOG.exception("[%s] Analysis error at ply %d", engine.name, i)
+                            res = None
+                        done_q.put_nowait((i, res))
+            finally:
+                done_q.put_nowait(None)
+
+        tasks = [asyncio.create_task(worker(e)) for e in self._engines(k)]
+        try:
+            yield fast_json.dumps({"status": "start"}) + _NDJSON_PAD + b"\n"
+            pending: List[Tuple[int, Optional[Dict[str, Any]]]] = []
+            expected = 0
+            finished = 0
+            while finished < k:
+                item = await done_q.get()
+                if item is None:
+                    finished += 1
+                    if finished < k:
+                        continue
+                else:
+                    heapq.heappush(pending, item)
+                # 全ワーカー終了後は欠番 (予算切れ・キャンセル) を飛ばして残りを流す
+                while pending and (pending[0][0] == expected or finished == k):
+                    i, res = heapq.heappop(pending)
+                    expected = i + 1
+                    if res and res["ok"]:
+                        if i % 2 != 0:
+                            _negate_scores(res["multipv"])
+                        yield fast_json.dumps({"ply": i, "result": res}) + _NDJSON_PAD + b"\n"
+                    else:
+                        _LOG.warning("[BatchEnginePool] Analysis failed at ply %d", i)
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
 
 # ★ Singleton instances (created once at import; lifespan wires up _MAIN_LOOP)
 stream_engine = EngineState(name="StreamEngine")
 batch_engine = BatchEngineState()
+batch_pool = BatchEnginePool(batch_engine, size=BATCH_ENGINES)
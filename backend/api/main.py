@@ -4,21 +4,42 @@ backend/api/main.py
 """
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import os
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from backend.api.middleware.rate_limit import RateLimitMiddleware
+from backend.api.engine_state import batch_pool
+from backend.api.middleware.rate_limit import RateLimitMiddleware, run_clock
 from backend.api.routers import annotate, analysis, explain, games
+from backend.api.services import bioshogi
+from backend.api.services.digest_workers import digest_workers
+from backend.api.services.explain_batcher import explain_batcher
+from backend.api.utils.log_queue import queue_logging
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # startup
+    queue_logging.start()
+    tasks = [
+        asyncio.create_task(run_clock()),
+        asyncio.create_task(explain_batcher.run()),
+        asyncio.create_task(digest_workers.run()),
+    ]
     yield
     # shutdown
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    bioshogi.close()
+    await batch_pool.close()
+    queue_logging.stop()
 
 
 app = FastAPI(
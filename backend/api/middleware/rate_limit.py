@@ -1,29 +1,36 @@
 from __future__ import annotations
 
+import asyncio
+import itertools
+import logging
 import os
-import threading
 import time
+from array import array
+from collections import OrderedDict, defaultdict
 from typing import Dict, List, Tuple, Optional
 
 from starlette.responses import JSONResponse
 
+try:
+    import redis.asyncio as aioredis
+    _HAS_REDIS = True
+except ImportError:
+    aioredis = None
+    _HAS_REDIS = False
 
-def _get_first_header(scope_headers, name_lower: bytes) -> Optional[str]:
-    for k, v in scope_headers or []:
-        if k.lower() == name_lower:
-            try:
-                return v.decode("utf-8")
-            except Exception:
-                return None
-    return None
+_LOG = logging.getLogger("uvicorn.error")
 
 
 def _get_client_ip(scope) -> str:
-    headers = scope.get("headers") or []
-    xff = _get_first_header(headers, b"x-forwarded-for")
-    if xff:
-        # X-Forwarded-For: client, proxy1, proxy2 ...
-        return (xff.split(",")[0] or "").strip() or "unknown"
+    # ASGI guarantees lower-cased header names, so compare bytes directly.
+    # latin-1 maps every octet and cannot fail on raw header values.
+    for k, v in scope.get("headers") or ():
+        if k == b"x-forwarded-for":
+            # X-Forwarded-For: client, proxy1, proxy2 ...
+            xff = v.decode("latin-1")
+            if xff:
+                return (xff.split(",")[0] or "").strip() or "unknown"
+            break
 
     client = scope.get("client")
     if client and isinstance(client, (list, tuple)) and len(client) >= 1:
@@ -39,6 +46,51 @@ def _env_int(key: str, default: int) -> int:
         return default
 
 
+# Number of state shards; must be a power of two.
+_NUM_SHARDS = 256
+_SHARD_MASK = _NUM_SHARDS - 1
+# Sliding window length in seconds (= number of one-second buckets).
+_WINDOW_SEC = 60
+# Sweep one shard for expired keys every N rate-limited requests.
+_GC_INTERVAL = 64
+# After a Redis error, skip Redis (memory only) for this many seconds.
+_REDIS_COOLDOWN_SEC = 30.0
+
+
+# ---- coarse clock ----
+# Refreshed by run_clock() every _CLOCK_TICK_SEC while the app is running, so
+# the request path reads a global instead of calling time.time(). Bucket
+# boundaries may lag by up to one tick.
+_CLOCK_TICK_SEC = 0.25
+_CLOCK_RUNNING = False
+_LAST_NOW = 0.0
+
+
+def _refresh_clock() -> None:
+    global _LAST_NOW
+    _LAST_NOW = time.time()
+
+
+async def run_clock() -> None:
+    """Keep the cached clock fresh; start once from the app lifespan."""
+    global _CLOCK_RUNNING
+    _refresh_clock()
+    _CLOCK_RUNNING = True
+    try:
+        while True:
+            await asyncio.sleep(_CLOCK_TICK_SEC)
+            _refresh_clock()
+    finally:
+        _CLOCK_RUNNING = False
+
+
+def _now() -> float:
+    """Return the current epoch time in seconds."""
+    if not _CLOCK_RUNNING:
+        _refresh_clock()
+    return _LAST_NOW
+
+
 # ---- rate-limit rule definition ----
 
 class _Rule:
@@ -51,16 +103,52 @@ class _Rule:
         self.method = method.upper()
         self.limit = limit
 
-    def matches(self, path: str, method: str) -> bool:
-        return method == self.method and path.startswith(self.prefix)
+
+class _Window:
+    """Ring of one-second request counters covering the last _WINDOW_SEC seconds."""
+
+    __slots__ = ("buckets", "last_second", "total")
+
+    def __init__(self, now_sec: int):
+        self.buckets = array("I", bytes(4 * _WINDOW_SEC))
+        self.last_second = now_sec
+        self.total = 0
+
+    def advance(self, now_sec: int) -> None:
+        """Zero the buckets for seconds that have passed since the last hit."""
+        elapsed = now_sec - self.last_second
+        if elapsed <= 0:
+            return
+        if elapsed >= _WINDOW_SEC:
+            self.buckets = array("I", bytes(4 * _WINDOW_SEC))
+            self.total = 0
+        else:
+            buckets = self.buckets
+            for s in range(self.last_second + 1, now_sec + 1):
+                i = s % _WINDOW_SEC
+                self.total -= buckets[i]
+                buckets[i] = 0
+        self.last_second = now_sec
+
+    def retry_after(self, now_sec: int) -> int:
+        """Seconds until the oldest counted request leaves the window."""
+        buckets = self.buckets
+        for age in range(_WINDOW_SEC - 1, -1, -1):
+            if buckets[(now_sec - age) % _WINDOW_SEC]:
+                return _WINDOW_SEC - age
+        return 1
 
 
 class RateLimitMiddleware:
-    """In-memory, per-IP fixed-window rate limiter.
+    """Per-IP rate limiter.
 
     Supports multiple path rules with individual limits.
     Enabled only when at least one rule has limit > 0.
-    Designed to be swapped to Redis later.
+
+    When RATE_LIMIT_REDIS_URL is set and redis-py is installed, requests are
+    counted in a Redis sorted-set sliding window shared by all workers.
+    Otherwise (or while Redis is unreachable) an in-memory sliding window of
+    one-second buckets is used.
     """
 
     def __init__(self, app):
@@ -75,41 +163,152 @@ class RateLimitMiddleware:
         # Drop disabled rules (limit <= 0)
         self._rules = [r for r in self._rules if r.limit > 0]
 
-        self._lock = threading.Lock()
-        # (ip, rule_prefix) -> (window_start_epoch_sec, count)
-        self._state: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        # method -> prefixes, longest first. One C-level startswith(tuple) rejects
+        # unmatched paths, and the first hit in the scan is the most specific
+        # rule. Methods without rules skip matching entirely.
+        self._prefix_to_rule: Dict[Tuple[str, str], _Rule] = {
+            (r.method, r.prefix): r for r in reversed(self._rules)
+        }
+        prefixes_by_method: Dict[str, set] = defaultdict(set)
+        for r in self._rules:
+            prefixes_by_method[r.method].add(r.prefix)
+        self._prefixes_by_method: Dict[str, Tuple[str, ...]] = {
+            m: tuple(sorted(ps, key=len, reverse=True))
+            for m, ps in prefixes_by_method.items()
+        }
+
+        # (ip, rule_prefix) -> _Window
+        # Sharded by key hash so stale-key sweeps can run one shard at a time.
+        # Each shard is an LRU capped at its share of RATE_LIMIT_MAX_KEYS, so
+        # memory stays bounded even with many distinct client IPs.
+        # The read-modify-write below has no await in between, so it is atomic
+        # on the event loop thread and needs no lock.
+        self._shards: List["OrderedDict[Tuple[str, str], _Window]"] = [
+            OrderedDict() for _ in range(_NUM_SHARDS)
+        ]
+        self._max_keys_per_shard = max(
+            1, _env_int("RATE_LIMIT_MAX_KEYS", 100_000) // _NUM_SHARDS
+        )
+        self._requests_since_gc = 0
+        self._gc_cursor = 0
+
+        self._redis = None
+        self._redis_ok = True
+        self._redis_retry_at = 0.0
+        self._redis_seq = itertools.count()
+        redis_url = (os.getenv("RATE_LIMIT_REDIS_URL") or "").strip()
+        if redis_url:
+            if _HAS_REDIS:
+                # Short timeouts so a blackholed Redis costs one brief wait before
+                # the cooldown kicks in, not a full TCP timeout per request.
+                timeout = _env_int("RATE_LIMIT_REDIS_TIMEOUT_MS", 200) / 1000.0
+                self._redis = aioredis.from_url(
+                    redis_url, socket_connect_timeout=timeout, socket_timeout=timeout,
+                )
+            else:
+                _LOG.warning(
+                    "[rate_limit] RATE_LIMIT_REDIS_URL is set but redis is not installed; "
+                    "using in-memory limiter."
+                )
+
+    async def _hit_redis(self, ip: str, rule: _Rule, now: float) -> Optional[Tuple[bool, int]]:
+        """Count a request in the Redis sliding window.
+
+        Returns (allowed, retry_after_sec), or None if Redis is unavailable or
+        still in its post-failure cooldown.
+        """
+        if now < self._redis_retry_at:
+            return None
+        key = f"ratelimit:{rule.prefix}:{ip}"
+        member = f"{now:.6f}:{next(self._redis_seq)}"
+        try:
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.zremrangebyscore(key, 0, now - _WINDOW_SEC)
+            pipe.zadd(key, {member: now})
+            pipe.zcard(key)
+            pipe.zrange(key, 0, 0, withscores=True)
+            pipe.expire(key, _WINDOW_SEC)
+            _, _, count, oldest, _ = await pipe.execute()
+        except Exception as e:
+            if self._redis_ok:
+                _LOG.warning("[rate_limit] redis unavailable, falling back to memory: %s", e)
+                self._redis_ok = False
+            self._redis_retry_at = now + _REDIS_COOLDOWN_SEC
+            return None
+
+        if not self._redis_ok:
+            _LOG.info("[rate_limit] redis reachable again")
+        self._redis_ok = True
+        if count <= rule.limit:
+            return True, 0
+        oldest_score = oldest[0][1] if oldest else now
+        return False, max(1, int(oldest_score + _WINDOW_SEC - now + 0.999))
+
+    def _hit_local(self, ip: str, rule: _Rule, now: int) -> Tuple[bool, int]:
+        """Count a request in the in-memory sliding window.
+
+        Returns (allowed, retry_after_sec).
+        """
+        key = (ip, rule.prefix)
+        shard = self._shards[hash(key) & _SHARD_MASK]
+
+        window = shard.get(key)
+        if window is None:
+            window = shard[key] = _Window(now)
+            if len(shard) > self._max_keys_per_shard:
+                shard.popitem(last=False)
+        else:
+            shard.move_to_end(key)
+            window.advance(now)
+        window.buckets[now % _WINDOW_SEC] += 1
+        window.total += 1
+        allowed = window.total <= rule.limit
+
+        self._requests_since_gc += 1
+        if self._requests_since_gc >= _GC_INTERVAL:
+            self._requests_since_gc = 0
+            self._gc_step(now)
+
+        return allowed, (0 if allowed else window.retry_after(now))
+
+    def _gc_step(self, now: int) -> None:
+        """Evict keys from one shard that have seen no request for a full window."""
+        shard = self._shards[self._gc_cursor]
+        self._gc_cursor = (self._gc_cursor + 1) & _SHARD_MASK
+        stale = [k for k, w in shard.items() if now - w.last_second >= _WINDOW_SEC]
+        for k in stale:
+            del shard[k]
 
     def _match(self, path: str, method: str) -> Optional[_Rule]:
-        for rule in self._rules:
-            if rule.matches(path, method):
-                return rule
+        prefixes = self._prefixes_by_method.get(method)
+        if not prefixes or not path.startswith(prefixes):
+            return None
+        for prefix in prefixes:
+            if path.startswith(prefix):
+                return self._prefix_to_rule[(method, prefix)]
         return None
 
     async def __call__(self, scope, receive, send):
-        if scope.get("type") != "http" or not self._rules:
+        if scope.get("type") != "http":
             return await self.app(scope, receive, send)
 
-        path = scope.get("path") or ""
         method = (scope.get("method") or "").upper()
+        if method not in self._prefixes_by_method:
+            return await self.app(scope, receive, send)
 
-        rule = self._match(path, method)
+        rule = self._match(scope.get("path") or "", method)
         if rule is None:
             return await self.app(scope, receive, send)
 
         ip = _get_client_ip(scope)
-        now = int(time.time())
-        window_start = now - (now % 60)
-        key = (ip, rule.prefix)
+        now_f = _now()
 
-        with self._lock:
-            prev = self._state.get(key)
-            if prev is None or prev[0] != window_start:
-                self._state[key] = (window_start, 1)
-                allowed = True
-            else:
-                count = prev[1] + 1
-                self._state[key] = (window_start, count)
-                allowed = count <= rule.limit
+        result = None
+        if self._redis is not None:
+            result = await self._hit_redis(ip, rule, now_f)
+        if result is None:
+            result = self._hit_local(ip, rule, int(now_f))
+        allowed, retry_after = result
 
         if allowed:
             return await self.app(scope, receive, send)
@@ -117,6 +316,6 @@ class RateLimitMiddleware:
         res = JSONResponse(
             {"detail": "Rate limit exceeded"},
             status_code=429,
-            headers={"Retry-After": str((window_start + 60) - now)},
+            headers={"Retry-After": str(retry_after)},
         )
         return await res(scope, receive, send)
@@ -3,18 +3,18 @@ backend/api/routers/analysis.py
 Routes: /api/analysis/*, /api/tsume/*, /api/solve/mate
 """
 from __future__ import annotations
-import json
-import uuid
+from os import urandom
 from typing import Optional, List
 
 from fastapi import APIRouter, Depends, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
 import logging
 
 from backend.api.auth import Principal, require_api_key, require_user
 from backend.api.tsume_data import TSUME_PROBLEMS
+from backend.api.utils import fast_json
 
 _LOG = logging.getLogger("uvicorn.error")
 from backend.api import engine_state as _es
@@ -43,14 +43,20 @@ class MateRequest(BaseModel):
     timeout: float = 5.0
 
 
+# TSUME_PROBLEMS は静的データなので一覧レスポンスは import 時に一度だけ組み立てる
+_TSUME_LIST = [{"id": p["id"], "title": p["title"], "steps": p["steps"]} for p in TSUME_PROBLEMS]
+_TSUME_LIST_JSON = fast_json.dumps(_TSUME_LIST)
+_TSUME_BY_ID = {p["id"]: p for p in TSUME_PROBLEMS}
+
+
 @router.get("/api/tsume/list")
 def get_tsume_list():
-    return [{"id": p["id"], "title": p["title"], "steps": p["steps"]} for p in TSUME_PROBLEMS]
+    return Response(content=_TSUME_LIST_JSON, media_type="application/json")
 
 
 @router.get("/api/tsume/{problem_id}")
 def get_tsume_detail(problem_id: int):
-    problem = next((p for p in TSUME_PROBLEMS if p["id"] == problem_id), None)
+    problem = _TSUME_BY_ID.get(problem_id)
     if not problem:
         return {"error": "Problem not found"}
     return problem
@@ -71,21 +77,21 @@ async def batch_endpoint(
     moves = req.moves or []
     if req.usi and "moves" in req.usi:
         moves = req.usi.split("moves")[1].split()
-    rid = request_id or uuid.uuid4().hex[:12]
+    rid = request_id or urandom(6).hex()
     ip = request.client.host if request.client else "unknown"
 
     async def generator():
         _LOG.info("[batch] start rid=%s ip=%s", rid, ip)
         try:
-            async for line in _es.batch_engine.stream_batch_analyze(moves, req.time_budget_ms):
+            async for line in _es.batch_pool.stream_batch_analyze(moves, req.time_budget_ms):
                 if await request.is_disconnected():
                     _LOG.info("[batch] client_disconnect rid=%s", rid)
-                    await _es.batch_engine.cancel_current()
+                    await _es.batch_pool.cancel_current()
                     break
                 yield line
         except Exception as e:
             _LOG.exception("[batch] error rid=%s", rid)
-            yield json.dumps({"error": "内部エラーが発生しました"}) + "\n"
+            yield fast_json.dumps({"error": "内部エラーが発生しました"}) + b"\n"
         finally:
             _LOG.info("[batch] end rid=%s", rid)
 
@@ -109,7 +115,7 @@ async def stream_endpoint(
     request_id: Optional[str] = None,
     _principal: Principal = Depends(require_user),
 ):
-    rid = request_id or uuid.uuid4().hex[:12]
+    rid = request_id or urandom(6).hex()
     ip = request.client.host if request.client else "unknown"
 
     async def generator():
@@ -146,22 +152,21 @@ def get_report(usi: str, _principal: Principal = Depends(require_user)):
     result = annotate_fn({"usi": usi})
     notes = result.notes or []
 
-    # 悪手カウント（delta_cp は自分視点: 負 = 悪化）
-    blunder_count = sum(
-        1 for n in notes
-        if isinstance(n.get("delta_cp"), (int, float)) and -300 < n["delta_cp"] <= -150
-    )
-    big_blunder_count = sum(
-        1 for n in notes
-        if isinstance(n.get("delta_cp"), (int, float)) and n["delta_cp"] <= -300
-    )
-
-    # ターニングポイント（|delta_cp| >= 150 の手）
-    turning_points = [
-        {"ply": n["ply"], "move": n["move"], "delta_cp": n["delta_cp"]}
-        for n in notes
-        if isinstance(n.get("delta_cp"), (int, float)) and abs(n["delta_cp"]) >= 150
-    ][:5]
+    # 悪手カウントとターニングポイント（|delta_cp| >= 150 の手）を1パスで集計
+    # delta_cp は自分視点: 負 = 悪化
+    blunder_count = 0
+    big_blunder_count = 0
+    turning_points: List[dict] = []
+    for n in notes:
+        d = n.get("delta_cp")
+        if not isinstance(d, (int, float)):
+            continue
+        if d <= -300:
+            big_blunder_count += 1
+        elif d <= -150:
+            blunder_count += 1
+        if (d >= 150 or d <= -150) and len(turning_points) < 5:
+            turning_points.append({"ply": n["ply"], "move": n["move"], "delta_cp": d})
 
     # bioshogi（annotate内で取得済みの場合はそのまま利用）
     bioshogi_data = result.bioshogi
@@ -5,15 +5,28 @@ Also owns the shared Pydantic models and annotate() function that tests referenc
 """
 from __future__ import annotations
 import asyncio
-from typing import Optional, Dict, Any, List
+import logging
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple
 
+import numpy as np
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel, Field
 
+from backend.ai import pv_reason as pv_reason_mod
 from backend.api.auth import Principal, require_api_key
 from backend.api import engine_state as _es
 from backend.api.services.bioshogi import analyze_kifu, is_available, BioshogiResult
 
+try:
+    import shogi  # type: ignore
+    _HAS_SHOGI = bool(getattr(pv_reason_mod, "HAS_SHOGI", False))
+except ImportError:
+    shogi = None
+    _HAS_SHOGI = False
+
+_LOG = logging.getLogger("uvicorn.error")
+
 router = APIRouter()
 
 # ====== Shared Pydantic models (re-exported via main.py for test compat) ======
@@ -50,15 +63,68 @@ class AnalyzeIn(BaseModel):
     multipv: int = 3
 
 
+# ====== Per-ply note (serialized to dict only when building the response) ======
+
+@dataclass(slots=True)
+class _Note:
+    ply: int
+    move: str
+    bestmove: str
+    score_before_cp: Optional[int]
+    score_after_cp: Optional[int]
+    delta_cp: Optional[int]
+    pv: str
+    tags: List[str]
+    is_check: bool
+    depth: int
+    pv_reason: Optional[Dict[str, Any]] = None
+    explain: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        evidence: Dict[str, Any] = {
+            "tactical": {"is_capture": False, "is_check": self.is_check},
+            "depth": self.depth,
+        }
+        d: Dict[str, Any] = {
+            "ply": self.ply,
+            "move": self.move,
+            "bestmove": self.bestmove,
+            "score_before_cp": self.score_before_cp,
+            "score_after_cp": self.score_after_cp,
+            "delta_cp": self.delta_cp,
+            "pv": self.pv,
+            "tags": self.tags,
+            "evidence": evidence,
+        }
+        if self.pv_reason is not None:
+            evidence["pv_reason"] = self.pv_reason
+            d["explain"] = self.explain
+        return d
+
+
 # ====== Engine adapter (wraps batch_engine for sync callers) ======
 
+# analyze_many で 1 手あたりに待つ時間 (秒)。チャンクごとに 手数 × この値 だけ待つ
+_ANALYZE_PER_PLY_TIMEOUT_SEC = 15.0
+
+def _on_loop_thread(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
 class _EnginePlaceholder:
     def analyze(self, payload: Any) -> AnalyzeResponse:
         raise RuntimeError("engine.analyze is not configured")
 
+    def analyze_many(self, payloads: List[Any]) -> List[AnalyzeResponse]:
+        raise RuntimeError("engine.analyze_many is not configured")
+
 
 class _EngineAdapter:
-    def analyze(self, payload: Any) -> AnalyzeResponse:
+    @staticmethod
+    def _position_cmd(payload: Any) -> str:
         data = _dump_model(payload)
         usi = (data or {}).get("usi") or ""
         ply_raw = (data or {}).get("ply")
@@ -69,7 +135,10 @@ class _EngineAdapter:
         moves_all = _extract_moves_from_usi(usi)
         moves_prefix = moves_all[:ply] if ply is not None else moves_all
         pos_str = "startpos moves " + " ".join(moves_prefix) if moves_prefix else "startpos"
-        position_cmd = f"position {pos_str}"
+        return f"position {pos_str}"
+
+    def analyze(self, payload: Any) -> AnalyzeResponse:
+        position_cmd = self._position_cmd(payload)
 
         async def _run() -> Dict[str, Any]:
             async with _es.batch_engine.lock:
@@ -78,15 +147,57 @@ class _EngineAdapter:
                 return await _es.batch_engine.fast_analyze_one(position_cmd)
 
         if _es._MAIN_LOOP is None:
-            print("[EngineAdapter] analyze skipped: main loop not initialized")
+            _LOG.warning("[EngineAdapter] analyze skipped: main loop not initialized")
+            return AnalyzeResponse(bestmove="", candidates=[])
+        if _on_loop_thread(_es._MAIN_LOOP):
+            _LOG.warning("[EngineAdapter] analyze skipped: called on the event loop thread")
             return AnalyzeResponse(bestmove="", candidates=[])
         try:
             fut = asyncio.run_coroutine_threadsafe(_run(), _es._MAIN_LOOP)
             res = fut.result(timeout=15.0)
         except Exception as e:
-            print(f"[EngineAdapter] analyze failed: {e}")
+            _LOG.warning("[EngineAdapter] analyze failed: %r", e)
             return AnalyzeResponse(bestmove="", candidates=[])
 
+        return self._to_response(res)
+
+    def analyze_many(self, payloads: List[Any]) -> List[AnalyzeResponse]:
+        """複数手分をまとめて1回のエンジンロックで解析する。"""
+        if not payloads:
+            return []
+        position_cmds = [self._position_cmd(p) for p in payloads]
+        empty = [AnalyzeResponse(bestmove="", candidates=[]) for _ in payloads]
+
+        if _es._MAIN_LOOP is None:
+            _LOG.warning("[EngineAdapter] analyze_many skipped: main loop not initialized")
+            return empty
+        if _on_loop_thread(_es._MAIN_LOOP):
+            # ループ上で結果を待つとデッドロックする。呼び出し側はスレッドプール経由で呼ぶこと。
+            _LOG.warning("[EngineAdapter] analyze_many skipped: called on the event loop thread")
+            return empty
+        # チャンク単位で待ち、途中で失敗してもそれまでに解析できた手は残す
+        out: List[AnalyzeResponse] = []
+        step = _es._ANALYZE_MANY_CHUNK
+        for start in range(0, len(position_cmds), step):
+            chunk = position_cmds[start:start + step]
+            fut = asyncio.run_coroutine_threadsafe(
+                _es.batch_engine.analyze_many(chunk), _es._MAIN_LOOP
+            )
+            try:
+                results = fut.result(timeout=_ANALYZE_PER_PLY_TIMEOUT_SEC * len(chunk))
+            except Exception as e:
+                # タイムアウト時もコルーチンを止め、エンジンのロックを解放させる
+                fut.cancel()
+                _LOG.warning(
+                    "[EngineAdapter] analyze_many failed at %d/%d: %r", start, len(position_cmds), e
+                )
+                break
+            out.extend(self._to_response(res) for res in results)
+
+        return out + empty[len(out):]
+
+    @staticmethod
+    def _to_response(res: Optional[Dict[str, Any]]) -> AnalyzeResponse:
         bestmove = (res or {}).get("bestmove") or ""
         multipv = (res or {}).get("multipv") or []
         candidates: List[PVItem] = []
@@ -125,12 +236,8 @@ def _extract_moves_from_usi(usi: str) -> List[str]:
     s = (usi or "").strip()
     if not s:
         return []
-    if "moves" in s:
-        try:
-            return s.split("moves", 1)[1].strip().split()
-        except Exception:
-            return []
-    return s.split()
+    _head, sep, tail = s.partition("moves")
+    return tail.split() if sep else s.split()
 
 
 def _tag_from_delta(delta_cp: Optional[int]) -> List[str]:
@@ -148,6 +255,43 @@ def _tag_from_delta(delta_cp: Optional[int]) -> List[str]:
     return []
 
 
+def _tags_from_deltas(deltas: np.ndarray) -> List[List[str]]:
+    """_tag_from_delta の一括版。NaN（評価値なし）はタグなし。"""
+    codes = np.select(
+        [deltas <= -300, deltas <= -150, deltas <= -50, deltas >= 150],
+        [1, 2, 3, 4],
+        default=0,
+    )
+    table = ([], ["大悪手"], ["悪手"], ["疑問手"], ["好手"])
+    return [list(table[c]) for c in codes.tolist()]
+
+
+def _score_deltas(
+    scores: List[Optional[int]],
+) -> Tuple[List[Optional[int]], List[Optional[int]], List[List[str]]]:
+    """先手視点の評価値列から (score_before_cp, delta_cp, tags) を一括計算する。
+
+    score_before は直前までで最後に得られた評価値。delta_cp は手番側視点
+    （負=手番側にとって悪化）で、奇数手（先手の手）はそのまま、偶数手は反転する。
+    """
+    n = len(scores)
+    if n == 0:
+        return [], [], []
+    arr = np.array([s if s is not None else np.nan for s in scores], dtype=float)
+    # 各手の直前までで最後に有効だった評価値のインデックス（なければ -1）
+    last_valid = np.where(~np.isnan(arr), np.arange(n), -1)
+    np.maximum.accumulate(last_valid, out=last_valid)
+    prev_idx = np.concatenate(([-1], last_valid[:-1]))
+    before = np.where(prev_idx >= 0, arr[np.maximum(prev_idx, 0)], np.nan)
+    sign = np.where(np.arange(n) % 2 == 0, 1.0, -1.0)
+    deltas = (arr - before) * sign
+
+    def _to_opt_int(a: np.ndarray) -> List[Optional[int]]:
+        return [None if x != x else int(x) for x in a.tolist()]
+
+    return _to_opt_int(before), _to_opt_int(deltas), _tags_from_deltas(deltas)
+
+
 def _digest_from_notes(notes: List[Dict[str, Any]]) -> Dict[str, Any]:
     key_moments: List[Dict[str, Any]] = []
     for n in notes:
@@ -165,6 +309,20 @@ def _digest_from_notes(notes: List[Dict[str, Any]]) -> Dict[str, Any]:
     }
 
 
+def _analyze_plies(usi: str, moves: List[str]) -> List[AnalyzeResponse]:
+    """各手を指した後の局面を解析する。
+
+    engine が analyze_many を持てば1回の呼び出しにまとめ、なければ手ごとに analyze する。
+    engine はテストで差し替えられるため、呼び出し時点の値を一度だけ解決する。
+    """
+    reqs = [{"usi": usi, "ply": i + 1, "move": mv} for i, mv in enumerate(moves)]
+    analyze_many = getattr(engine, "analyze_many", None)
+    if callable(analyze_many):
+        return analyze_many(reqs)
+    analyze = engine.analyze
+    return [analyze(req) for req in reqs]
+
+
 def _dump_model(obj: Any) -> Any:
     """Pydantic v2/v1 compatible dump."""
     md = getattr(obj, "model_dump", None)
@@ -195,59 +353,56 @@ def annotate(payload: Any) -> AnnotateResponse:
     options = (data or {}).get("options") or {}
     moves = _extract_moves_from_usi(usi)
 
-    notes: List[Dict[str, Any]] = []
-    prev_score: Optional[int] = None
+    results = _analyze_plies(usi, moves)
+    scores: List[Optional[int]] = []
+    for i, res in enumerate(results):
+        score_raw: Optional[int] = None
+        if res.candidates:
+            score_raw = res.candidates[0].score_cp
+
+        # エンジンは手番視点(side-to-move)でスコアを返す。先手視点に統一する。
+        # ply手指した後: plyが奇数→後手の手番(反転), plyが偶数→先手の手番(そのまま)
+        score_after: Optional[int] = None
+        if isinstance(score_raw, int):
+            score_after = -score_raw if (i + 1) % 2 != 0 else score_raw
+        scores.append(score_after)
+
+    # 評価値差分とタグは全手分まとめて計算する
+    scores_before, deltas, tags_list = _score_deltas(scores)
+
+    note_objs: List[_Note] = []
     last_res: Optional[AnalyzeResponse] = None
+    # moves[:i] を空白区切りで連結したもの（毎手 join し直さないよう逐次伸ばす）
+    prefix_str = ""
 
     for i, mv in enumerate(moves):
-        req = {"usi": usi, "ply": i + 1, "move": mv}
-        res = engine.analyze(req)
-
-        score_raw: Optional[int] = None
+        res = results[i]
         depth: Optional[int] = None
         pv_line: List[str] = []
         if res.candidates:
             cand0 = res.candidates[0]
-            score_raw = cand0.score_cp
             depth = cand0.depth
             pv_line = cand0.pv or []
 
-        # エンジンは手番視点(side-to-move)でスコアを返す。先手視点に統一する。
-        # ply手指した後: plyが奇数→後手の手番(反転), plyが偶数→先手の手番(そのまま)
-        ply = i + 1
-        score_after: Optional[int] = None
-        if isinstance(score_raw, int):
-            score_after = -score_raw if ply % 2 != 0 else score_raw
-
-        delta_cp: Optional[int] = None
-        if isinstance(score_after, int) and isinstance(prev_score, int):
-            sente_diff = score_after - prev_score
-            # 手番側視点に変換（負=手番側にとって悪化）
-            is_sente_move = (ply % 2 != 0)
-            delta_cp = sente_diff if is_sente_move else -sente_diff
-
-        note: Dict[str, Any] = {
-            "ply": i + 1,
-            "move": mv,
-            "bestmove": res.bestmove,
-            "score_before_cp": prev_score,
-            "score_after_cp": score_after,
-            "delta_cp": delta_cp,
-            "pv": " ".join(pv_line) if pv_line else "",
-            "tags": _tag_from_delta(delta_cp),
-            "evidence": {
-                "tactical": {"is_capture": False, "is_check": "+" in (mv or "")},
-                "depth": depth or 0,
-            },
-        }
-        notes.append(note)
+        pv_str = " ".join(pv_line) if pv_line else ""
+        note = _Note(
+            ply=i + 1,
+            move=mv,
+            bestmove=res.bestmove,
+            score_before_cp=scores_before[i],
+            score_after_cp=scores[i],
+            delta_cp=deltas[i],
+            pv=pv_str,
+            tags=tags_list[i],
+            is_check="+" in (mv or ""),
+            depth=depth or 0,
+        )
+        note_objs.append(note)
 
         try:
-            if pv_line and (note["tags"] or options):
-                from backend.ai import pv_reason as pv_reason_mod
+            if pv_line and (note.tags or options):
                 pv_reason = None
-                if getattr(pv_reason_mod, "HAS_SHOGI", False):
-                    import shogi  # type: ignore
+                if _HAS_SHOGI:
                     b = shogi.Board()
                     for m0 in moves[:i]:
                         try:
@@ -258,22 +413,22 @@ def annotate(payload: Any) -> AnnotateResponse:
                                 b.push(mv0)
                         except Exception:
                             break
-                    pv_reason = pv_reason_mod.build_pv_reason(b, mv, " ".join(pv_line), options)
+                    pv_reason = pv_reason_mod.build_pv_reason(b, mv, pv_str, options)
                 else:
-                    pos_str = "startpos moves " + " ".join(moves[:i]) if moves[:i] else "startpos"
+                    pos_str = "startpos moves " + prefix_str if prefix_str else "startpos"
                     position_cmd = f"position {pos_str}"
                     pv_reason = pv_reason_mod.build_pv_reason_fallback(
-                        position_cmd, " ".join(pv_line), options
+                        position_cmd, pv_str, options
                     )
                 if pv_reason:
-                    note.setdefault("evidence", {}).setdefault("pv_reason", pv_reason)
-                    note["explain"] = pv_reason.get("summary")
+                    note.pv_reason = pv_reason
+                    note.explain = pv_reason.get("summary")
         except Exception:
             pass
 
-        if isinstance(score_after, int):
-            prev_score = score_after
+        prefix_str = prefix_str + " " + mv if prefix_str else mv
 
+    notes: List[Dict[str, Any]] = [n.to_dict() for n in note_objs]
     if not notes:
         notes = [{"ply": 1, "move": "", "tags": [], "evidence": {"tactical": {"is_capture": False}}}]
 
@@ -330,9 +485,9 @@ def digest_endpoint_compat(payload: Dict[str, Any]):
     moves = _extract_moves_from_usi(usi)
     notes: List[Dict[str, Any]] = []
     prev_score: Optional[int] = None
+    results = _analyze_plies(usi, moves)
     for i, mv in enumerate(moves):
-        req = {"usi": usi, "ply": i + 1, "move": mv}
-        res = engine.analyze(req)
+        res = results[i]
         score_raw: Optional[int] = None
         if res.candidates:
             score_raw = res.candidates[0].score_cp
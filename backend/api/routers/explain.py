@@ -3,24 +3,35 @@ backend/api/routers/explain.py
 Routes: /api/explain, /api/explain/digest
 """
 from __future__ import annotations
+import asyncio
+import copy
 import logging
-import uuid
-from typing import Optional, List
+import sys
+from functools import lru_cache
+from os import urandom
+from typing import Optional, List, Tuple
 
+import numpy as np
 from fastapi import APIRouter, Depends, Request
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, TypeAdapter
 
 from backend.api.auth import Principal, require_user
 
 _LOG = logging.getLogger("uvicorn.error")
 from backend.api.services.ai_service import AIService, _get_style_selector
+from backend.api.services.digest_workers import digest_workers
+from backend.api.services.explain_batcher import explain_batcher
 from backend.api.services.game_metrics import calculate_skill_score, calculate_tension_timeline
 from backend.api.services.ml_trainer import rule_based_predict
-from backend.api.services.position_features import extract_position_features
-from backend.api.routers.annotate import _dump_model
+from backend.api.services.position_features import (
+    extract_position_features,
+    extract_position_features_from_board,
+)
+from backend.api.utils.fast_json import FastJSONResponse
+from backend.api.utils.shogi_explain_core import apply_usi_move, parse_position_cmd
 
-router = APIRouter(prefix="/api")
+router = APIRouter(prefix="/api", default_response_class=FastJSONResponse)
 
 
 class ExplainCandidate(BaseModel):
@@ -29,6 +40,10 @@ class ExplainCandidate(BaseModel):
     score_mate: Optional[int] = None
 
 
+# 候補手リストを pydantic-core の1回の呼び出しで dict 化する
+_CANDIDATES_ADAPTER = TypeAdapter(List[ExplainCandidate])
+
+
 class PositionCommentRequest(BaseModel):
     ply: int
     sfen: str
@@ -52,33 +67,54 @@ class GameDigestInput(BaseModel):
     moves: Optional[List[str]] = None   # USI手順リスト（特徴量抽出用、省略可）
 
 
-def _extract_digest_features(moves: List[str], max_samples: int = 20) -> List[dict]:
-    """手順リストから等間隔でサンプリングして局面特徴量を抽出."""
+@lru_cache(maxsize=256)
+def _digest_features_for(moves: Tuple[str, ...], max_samples: int) -> Tuple[dict, ...]:
     n = len(moves)
     if n == 0:
-        return []
-    step = max(1, n // max_samples)
-    sample_indices = list(range(0, n, step))[:max_samples]
+        return ()
+    # 初手から最終手まで等間隔に取る (range(0, n, step) だと短い棋譜で終盤が抜ける)
+    sample_indices = set(
+        np.unique(np.linspace(0, n - 1, min(max_samples, n), dtype=np.int64)).tolist()
+    )
 
+    # 盤面を1手ずつ進め、サンプル手数でだけ特徴量を取る (手順文字列の再パースなし)
+    board = parse_position_cmd("position startpos").board
+    turn = "b"
     features_list: List[dict] = []
     prev_features = None
-    for idx in sample_indices:
-        sfen = "position startpos moves " + " ".join(moves[: idx + 1])
-        move = moves[idx]
-        f = extract_position_features(
-            sfen=sfen,
-            move=move,
-            ply=idx + 1,
-            prev_features=prev_features,
-        )
-        prev_features = f
-        features_list.append(f)
-    return features_list
+    for idx, mv in enumerate(moves):
+        if mv:
+            board, _ = apply_usi_move(board, mv, turn)
+            turn = "w" if turn == "b" else "b"
+        if idx in sample_indices:
+            f = extract_position_features_from_board(
+                board, turn,
+                move=mv,
+                ply=idx + 1,
+                prev_features=prev_features,
+            )
+            prev_features = f
+            features_list.append(f)
+            if len(features_list) == len(sample_indices):
+                break
+    return tuple(features_list)
+
+
+def _extract_digest_features(moves: List[str], max_samples: int = 20) -> List[dict]:
+    """手順リストから等間隔でサンプリングして局面特徴量を抽出.
+
+    同じ手順の再ダイジェストは対局単位のキャッシュから返す。
+    キャッシュ内の dict (入れ子の tension_delta / after を含む) を呼び出し側や
+    並行リクエストと共有しないよう、深いコピーを返す。
+    """
+    # 手文字列を intern しておくと、キャッシュヒット時のキー比較が同一性チェックで済む
+    cached = _digest_features_for(tuple(map(sys.intern, moves)), max_samples)
+    return copy.deepcopy(list(cached))
 
 
 @router.post("/explain")
 async def explain_endpoint(req: PositionCommentRequest, _principal: Principal = Depends(require_user)):
-    candidates = [c.model_dump() for c in req.candidates]
+    candidates = _CANDIDATES_ADAPTER.dump_python(req.candidates)
 
     # 構造化プラン経由の新パスを使うか判定
     # 明示的に use_planner=true のときだけ新方式にする (既存フロント互換)
@@ -123,7 +159,12 @@ async def explain_endpoint(req: PositionCommentRequest, _principal: Principal =
             style_used = rule_based_predict(features)
     style_used = style_used or "neutral"
 
-    comment = await AIService.generate_position_comment(
+    # バッチャー稼働中は同時リクエストを1回の LLM 呼び出しにまとめる
+    generate = (
+        explain_batcher.submit if explain_batcher.running
+        else AIService.generate_position_comment
+    )
+    comment = await generate(
         ply=req.ply,
         sfen=req.sfen,
         candidates=candidates,
@@ -142,23 +183,40 @@ async def digest_endpoint(
     force_llm: bool = False,
     _principal: Principal = Depends(require_user),
 ):
-    rid = uuid.uuid4().hex[:12]
-    ip = request.client.host if request.client else "unknown"
-    _LOG.info("[digest] in rid=%s ip=%s path=/api/explain/digest", rid, ip)
-    payload = _dump_model(req) or {}
+    rid = urandom(6).hex()
+    if _LOG.isEnabledFor(logging.INFO):
+        client = request.client
+        _LOG.info("[digest] in rid=%s ip=%s path=/api/explain/digest", rid, client.host if client else "unknown")
+    # GameDigestInput のフィールドはネストしたモデルを持たないので、
+    # model_dump の深いコピーは不要。フィールド値を共有する浅い dict で渡す。
+    payload = dict(req)
     payload["_request_id"] = rid
     payload["force_llm"] = force_llm
 
-    # 手順が渡されていれば局面特徴量をサンプリング抽出
-    if req.moves:
-        try:
-            digest_features = _extract_digest_features(req.moves)
-            payload["digest_features"] = digest_features
-        except Exception:
-            _LOG.warning("[digest] digest_features extraction failed, continuing without features")
-
-    result = await AIService.generate_game_digest(payload)
-    result["skill_score"] = calculate_skill_score(req.notes, req.total_moves)
-    result["tension"] = calculate_tension_timeline(req.eval_history)
+    # キャッシュ済みなら特徴量抽出も LLM も不要
+    result = AIService.get_cached_game_digest(payload)
+    if result is not None:
+        result["skill_score"] = calculate_skill_score(req.notes, req.total_moves)
+        result["tension"] = calculate_tension_timeline(req.eval_history)
+    else:
+        async def _generate() -> dict:
+            # 手順が渡されていれば局面特徴量をサンプリング抽出
+            if req.moves:
+                try:
+                    # CPU 処理なのでイベントループを塞がないようスレッドプールで実行
+                    payload["digest_features"] = await run_in_threadpool(_extract_digest_features, req.moves)
+                except Exception:
+                    _LOG.warning("[digest] digest_features extraction failed, continuing without features")
+            return await AIService.generate_game_digest(payload)
+
+        # 指標は LLM 結果に依存しないので、特徴量抽出 → LLM と並行して計算する。
+        # 生成はワーカープール稼働中ならそこで実行し、同時実行数を抑える。
+        result, skill_score, tension = await asyncio.gather(
+            digest_workers.submit(_generate) if digest_workers.running else _generate(),
+            run_in_threadpool(calculate_skill_score, req.notes, req.total_moves),
+            run_in_threadpool(calculate_tension_timeline, req.eval_history),
+        )
+        result["skill_score"] = skill_score
+        result["tension"] = tension
     headers = result.pop("_headers", None) or {}
-    return JSONResponse(result, headers=headers)
+    return FastJSONResponse(result, headers=headers)
@@ -1,16 +1,20 @@
 import asyncio
+import math
 import os
 import time
 import logging
 import re
 import json
 import hashlib
+from bisect import bisect_left
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import List, Optional, Dict, Any, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
-import google.generativeai as genai
+import numpy as np
 from google.api_core import exceptions as gax_exceptions
-from backend.api.utils.gemini_client import ensure_configured
+from backend.api.utils import fast_json
+from backend.api.utils.gemini_client import ensure_configured, get_generative_model
 from backend.api.utils.shogi_utils import ShogiUtils
 from backend.api.services.training_logger import training_logger
 from backend.api.services.position_features import extract_position_features
@@ -36,31 +40,99 @@ _STYLE_INSTRUCTIONS = {
     "neutral": "客観的かつ淡々と、局面の状況を正確に解説してください。",
 }
 
+class _TTLCache:
+    """Bounded in-memory cache: LRU eviction plus a per-entry TTL.
+
+    Overflow drops only the least recently used entry, so warm keys survive.
+    Ages use time.monotonic() so wall-clock adjustments cannot expire or revive
+    entries. get/set never await, so they are atomic on the event loop.
+    """
+
+    def __init__(self, maxsize: int, ttl_sec: float):
+        self.maxsize = maxsize
+        self.ttl_sec = ttl_sec
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        v = self._data.get(key)
+        if v is None:
+            return None
+        ts, value = v
+        if time.monotonic() - ts > self.ttl_sec:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
 # --- digest cache (in-memory, dev only) ---
 _DIGEST_CACHE_TTL_SEC = int(os.getenv("DIGEST_CACHE_TTL_SEC", "600"))
-_DIGEST_CACHE: Dict[str, Dict[str, Any]] = {}
+_DIGEST_CACHE = _TTLCache(maxsize=500, ttl_sec=_DIGEST_CACHE_TTL_SEC)
 
 
-
-_EXPLAIN_CACHE: Dict[str, Tuple[float, str]] = {}
 _EXPLAIN_CACHE_TTL_SEC = int(os.getenv("EXPLAIN_CACHE_TTL_SEC", "600"))
+_EXPLAIN_CACHE = _TTLCache(maxsize=500, ttl_sec=_EXPLAIN_CACHE_TTL_SEC)
+
+
+class _TokenBucket:
+    """Client-side request budget for Gemini (rate_per_min tokens, refilled continuously).
+
+    acquire() reserves a token and sleeps until it is due. When the wait would
+    exceed max_wait_sec it gives the reservation back and returns the wait
+    instead, so the caller can answer with a fallback without a doomed request.
+    A rate of 0 disables the bucket. There is no await between reading and
+    updating the level, so it needs no lock on the event loop.
+    """
+
+    def __init__(self, rate_per_min: int, max_wait_sec: float):
+        self.rate = max(0, rate_per_min) / 60.0
+        self.capacity = float(max(1, rate_per_min))
+        self.max_wait_sec = max_wait_sec
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> float:
+        """0.0 if a token was taken, otherwise the seconds until one frees up."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate) - 1
+        self._updated = now
+        if self._tokens >= 0:
+            return 0.0
+        wait = -self._tokens / self.rate
+        if wait > self.max_wait_sec:
+            self._tokens += 1
+            return wait
+        await asyncio.sleep(wait)
+        return 0.0
+
+
+# GEMINI_RPM=0 (既定) で無効。契約枠に合わせて設定する
+_GEMINI_BUDGET = _TokenBucket(
+    rate_per_min=int(os.getenv("GEMINI_RPM", "0") or 0),
+    max_wait_sec=int(os.getenv("GEMINI_RPM_MAX_WAIT_MS", "500") or 0) / 1000.0,
+)
 
 
 def _cache_get(key: str) -> Optional[str]:
-    v = _EXPLAIN_CACHE.get(key)
-    if not v:
-        return None
-    ts, text = v
-    if time.time() - ts > _EXPLAIN_CACHE_TTL_SEC:
-        _EXPLAIN_CACHE.pop(key, None)
-        return None
-    return text
+    return _EXPLAIN_CACHE.get(key)
 
 
 def _cache_set(key: str, text: str) -> None:
-    if len(_EXPLAIN_CACHE) > 500:
-        _EXPLAIN_CACHE.clear()
-    _EXPLAIN_CACHE[key] = (time.time(), text)
+    _EXPLAIN_CACHE.set(key, text)
 
 
 def _detect_turn(sfen: str) -> str:
@@ -98,26 +170,33 @@ def _detect_turn(sfen: str) -> str:
     return "b"
 
 
+def _build_label_lut(levels: Tuple[Tuple[int, str], ...], lowest: str) -> Tuple[str, ...]:
+    """0-100 の各整数値に対するラベル表を作る。levels は (下限, ラベル) の降順。"""
+    return tuple(
+        next((label for threshold, label in levels if v >= threshold), lowest)
+        for v in range(101)
+    )
+
+
+_SAFETY_LUT = _build_label_lut(
+    ((80, "堅い囲いで安定"), (55, "ある程度守られている"), (30, "やや不安定")),
+    "玉が危険な状態",
+)
+_PRESSURE_LUT = _build_label_lut(
+    ((70, "強い攻撃態勢"), (40, "攻めの形ができつつある"), (15, "まだ様子見")),
+    "攻めの形なし",
+)
+
+
 def _describe_safety(value: int) -> str:
     """king_safety (0-100) を人間が読める説明に変換."""
-    if value >= 80:
-        return "堅い囲いで安定"
-    if value >= 55:
-        return "ある程度守られている"
-    if value >= 30:
-        return "やや不安定"
-    return "玉が危険な状態"
+    # 閾値は整数なので、小数は切り捨てても判定は変わらない
+    return _SAFETY_LUT[min(100, max(0, int(value)))]
 
 
 def _describe_pressure(value: int) -> str:
     """attack_pressure (0-100) を人間が読める説明に変換."""
-    if value >= 70:
-        return "強い攻撃態勢"
-    if value >= 40:
-        return "攻めの形ができつつある"
-    if value >= 15:
-        return "まだ様子見"
-    return "攻めの形なし"
+    return _PRESSURE_LUT[min(100, max(0, int(value)))]
 
 
 _PHASE_JP = {"opening": "序盤", "midgame": "中盤", "endgame": "終盤"}
@@ -137,55 +216,63 @@ def build_digest_features_block(features_list: List[Dict[str, Any]]) -> str:
         return ""
     n = len(features_list)
 
-    # フェーズ推移を検出
-    phases = [f.get("phase", "midgame") for f in features_list]
+    thirds = max(1, n // 3)
+
+    # 1 パスで集計: フェーズごとの出現範囲、序盤/中盤/終盤の合計、攻めの圧力の最大変化
+    phase_range: Dict[str, List[int]] = {}
+    seg_ks = [0, 0, 0]
+    seg_ap = [0, 0, 0]
+    seg_n = [0, 0, 0]
+    max_jump = 0
+    jump_idx = 0
+    prev_ap = None
+    for i, f in enumerate(features_list):
+        label = f.get("phase", "midgame")
+        rng = phase_range.get(label)
+        if rng is None:
+            phase_range[label] = [i, i]
+        else:
+            rng[1] = i
+
+        ap = f.get("attack_pressure", 0)
+        seg = 0 if i < thirds else (1 if i < 2 * thirds else 2)
+        seg_ks[seg] += f.get("king_safety", 0)
+        seg_ap[seg] += ap
+        seg_n[seg] += 1
+
+        # 攻守切り替わりポイント: attack_pressure が大きく変化した箇所
+        if prev_ap is not None:
+            d = abs(ap - prev_ap)
+            if d > max_jump:
+                max_jump = d
+                jump_idx = i
+        prev_ap = ap
+
     phase_transitions: List[str] = []
     for label in ("opening", "midgame", "endgame"):
-        indices = [i for i, p in enumerate(phases) if p == label]
-        if indices:
+        rng = phase_range.get(label)
+        if rng:
             jp = _PHASE_JP.get(label, label)
-            phase_transitions.append(f"{jp}({indices[0]+1}〜{indices[-1]+1}手目)")
+            phase_transitions.append(f"{jp}({rng[0]+1}〜{rng[1]+1}手目)")
 
     # 攻守の平均推移 (序盤/中盤/終盤)
-    thirds = max(1, n // 3)
-    segments = [
-        ("序盤", features_list[:thirds]),
-        ("中盤", features_list[thirds:2 * thirds]),
-        ("終盤", features_list[2 * thirds:]),
-    ]
-
-    def _avg(lst: List[Dict[str, Any]], key: str) -> int:
-        vals = [f.get(key, 0) for f in lst]
-        return int(sum(vals) / max(1, len(vals)))
-
-    lines = ["\n【局面特徴量サマリー】"]
-    if phase_transitions:
-        lines.append(f"局面推移: {' → '.join(phase_transitions)}")
-
-    for seg_name, seg_data in segments:
-        if not seg_data:
-            continue
-        ks = _avg(seg_data, "king_safety")
-        ap = _avg(seg_data, "attack_pressure")
-        lines.append(
+    seg_avgs = (
+        (seg_name, int(seg_ks[seg] / seg_n[seg]), int(seg_ap[seg] / seg_n[seg]))
+        for seg, seg_name in enumerate(("序盤", "中盤", "終盤"))
+        if seg_n[seg]
+    )
+    lines = (
+        "\n【局面特徴量サマリー】",
+        f"局面推移: {' → '.join(phase_transitions)}" if phase_transitions else None,
+        *(
             f"{seg_name}: 玉の安全度={ks}/100({_describe_safety(ks)}), "
             f"攻めの圧力={ap}/100({_describe_pressure(ap)})"
-        )
-
-    # 攻守切り替わりポイント: attack_pressure が大きく変化した箇所
-    pressure_vals = [f.get("attack_pressure", 0) for f in features_list]
-    max_jump = 0
-    jump_idx = 0
-    for i in range(1, len(pressure_vals)):
-        d = abs(pressure_vals[i] - pressure_vals[i - 1])
-        if d > max_jump:
-            max_jump = d
-            jump_idx = i
-    if max_jump >= 15:
-        lines.append(f"攻守の切り替わり: {jump_idx + 1}手目付近（圧力変化 {max_jump}pt）")
-
-    lines.append("上記を踏まえ、対局全体の流れを自然な文章で説明してください。")
-    return "\n".join(lines)
+            for seg_name, ks, ap in seg_avgs
+        ),
+        f"攻守の切り替わり: {jump_idx + 1}手目付近（圧力変化 {max_jump}pt）" if max_jump >= 15 else None,
+        "上記を踏まえ、対局全体の流れを自然な文章で説明してください。",
+    )
+    return "\n".join(line for line in lines if line is not None)
 
 
 def build_board_analysis_block(analysis: Any) -> str:
@@ -273,22 +360,19 @@ def build_features_block(features: Dict[str, Any]) -> str:
     opp_ks = after.get("king_safety")
     opp_ap = after.get("attack_pressure")
 
-    lines = [
+    # 該当しない行は None にして join 時に除く ("" は空行として残す)
+    lines = (
         "\n【局面の状況】",
         f"局面: {phase}",
         f"手番側の玉の安全度: {ks}/100（{_describe_safety(ks)}）",
-    ]
-    if opp_ks is not None:
-        lines.append(f"相手側の玉の安全度: {opp_ks}/100（{_describe_safety(opp_ks)}）")
-    lines.append(f"手番側の攻めの圧力: {ap}/100（{_describe_pressure(ap)}）")
-    if opp_ap is not None:
-        lines.append(f"相手側の攻めの圧力: {opp_ap}/100（{_describe_pressure(opp_ap)}）")
-    if intent_jp:
-        lines.append(f"この手の意図: {intent_jp}")
-    lines.append("")
-    lines.append("上記を踏まえ、「なぜこの手が指されたか」を局面の状況と結びつけて説明してください。")
-
-    return "\n".join(lines)
+        f"相手側の玉の安全度: {opp_ks}/100（{_describe_safety(opp_ks)}）" if opp_ks is not None else None,
+        f"手番側の攻めの圧力: {ap}/100（{_describe_pressure(ap)}）",
+        f"相手側の攻めの圧力: {opp_ap}/100（{_describe_pressure(opp_ap)}）" if opp_ap is not None else None,
+        f"この手の意図: {intent_jp}" if intent_jp else None,
+        "",
+        "上記を踏まえ、「なぜこの手が指されたか」を局面の状況と結びつけて説明してください。",
+    )
+    return "\n".join(line for line in lines if line is not None)
 
 
 async def _log_explanation(**kwargs: Any) -> None:
@@ -345,6 +429,199 @@ async def _log_digest(**kwargs: Any) -> None:
         _LOG.debug("[training_logger] digest log failed: %s", e)
 
 
+# 形勢ラベル: |cp| が各閾値を超えるごとに1段上がる (bisect_left なので 300 ちょうどは互角)
+_SITUATION_CP_THRESHOLDS = (300, 800, 2000)
+_SITUATION_SENTE = ("互角", "先手有利", "先手優勢", "先手勝勢")
+_SITUATION_GOTE = ("互角", "後手有利", "後手優勢", "後手勝勢")
+
+
+def _build_position_comment_row(
+    ply: int,
+    sfen: str,
+    candidates: List[Dict[str, Any]],
+    user_move: Optional[str],
+    delta_cp: Optional[int],
+    features: Optional[Dict[str, Any]] = None,
+    style: Optional[str] = None,
+) -> Tuple[str, str]:
+    """局面ごとに変わるプロンプト部分を組み立てる。(row, 確定した style) を返す。"""
+    # 形勢判定
+    best_cp = None
+    best_move_usi = ""
+    if candidates:
+        top = candidates[0]
+        best_move_usi = top.get("move", "")
+        if top.get("score_mate") is not None:
+            best_cp = 30000 if top["score_mate"] >= 0 else -30000
+        elif top.get("score_cp") is not None:
+            best_cp = top["score_cp"]
+
+    if best_cp is None:
+        situation = "不明"
+    else:
+        i = bisect_left(_SITUATION_CP_THRESHOLDS, abs(best_cp))
+        situation = (_SITUATION_SENTE if best_cp > 0 else _SITUATION_GOTE)[i]
+
+    # 指し手の評価
+    good_or_bad = "普通"
+    if delta_cp is not None:
+        if delta_cp <= -150:
+            good_or_bad = "悪手"
+        elif delta_cp <= -50:
+            good_or_bad = "疑問手"
+        elif delta_cp >= 150:
+            good_or_bad = "好手"
+
+    # 日本語ラベル
+    turn = _detect_turn(sfen)
+    best_move_jp = ShogiUtils.format_move_label(best_move_usi, turn) if best_move_usi else "なし"
+    user_move_jp = ShogiUtils.format_move_label(user_move, turn) if user_move else "なし"
+
+    # 特徴量ブロック
+    features_block = build_features_block(features) if features else ""
+
+    # 盤面分析ブロック (BoardAnalyzer)
+    board_analysis_block = ""
+    try:
+        from backend.api.services.board_analyzer import BoardAnalyzer
+        analysis = BoardAnalyzer().analyze(
+            position_cmd=sfen,
+            move=user_move,
+            ply=ply,
+        )
+        board_analysis_block = build_board_analysis_block(analysis)
+    except Exception:
+        _LOG.debug("[explain] BoardAnalyzer failed, continuing without board analysis")
+
+    # スタイル選択
+    if style is None and features:
+        style = _get_style_selector().predict(features)
+    style = style or "neutral"
+    style_instruction = _STYLE_INSTRUCTIONS.get(style, _STYLE_INSTRUCTIONS["neutral"])
+
+    row = f"""手数: {ply}手目
+指された手: {user_move_jp}（この手の評価: {good_or_bad}）
+AI推奨手: {best_move_jp}
+形勢: {situation}
+{features_block}{board_analysis_block}
+トーン: {style_instruction}"""
+    return row, style
+
+
+# レガシー局面解説プロンプトの固定部分 (局面ごとに変わる row を挟む)
+_POSITION_PROMPT_HEADER = """あなたは将棋の局面解説AIです。
+以下の局面について、80文字以内で解説してください。
+
+"""
+_POSITION_PROMPT_RULES = """
+ルール:
+- 80文字以内で完結すること
+- 地の文のみ。箇条書き・見出し・記号禁止
+- です/ます調
+- 文章を途中で切らないこと"""
+
+
+def _build_position_comment_prompt(**kwargs: Any) -> Tuple[str, str]:
+    """レガシー局面解説のプロンプトを組み立てる。(prompt, 確定した style) を返す。"""
+    row, style = _build_position_comment_row(**kwargs)
+    return _POSITION_PROMPT_HEADER + row + _POSITION_PROMPT_RULES, style
+
+
+# 1回のバッチ呼び出しにまとめる局面数の上限 (これを超える分は別リクエストに分ける)
+_COMMENT_BATCH_MAX_ROWS = 8
+
+
+def _build_batch_prompt(rows: List[str]) -> str:
+    """複数局面の解説依頼を、指示とルールを1回だけ書いた1プロンプトにまとめる。"""
+    n = len(rows)
+    body = "\n\n".join(f"### 局面{i}\n{row}" for i, row in enumerate(rows, 1))
+    return f"""あなたは将棋の局面解説AIです。
+以下の{n}件の局面それぞれについて、80文字以内で解説してください。
+
+{body}
+
+ルール:
+- 各局面の解説は80文字以内で完結すること
+- 地の文のみ。箇条書き・見出し・記号禁止
+- です/ます調
+- 文章を途中で切らないこと
+- 出力は長さ{n}の JSON 文字列配列のみとし、i 番目の要素に局面 i の解説文を入れること"""
+
+
+def _parse_batch_texts(text: str, n: int) -> Optional[List[str]]:
+    """バッチ応答 (JSON 文字列配列) をパースする。件数が合わなければ None。"""
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, list) or len(data) != n:
+        return None
+    if not all(isinstance(t, str) and t.strip() for t in data):
+        return None
+    return data
+
+
+# ストリーミング生成で文字数上限を超えてから打ち切るまでの余裕
+_STREAM_OVERRUN_CHARS = 20
+
+
+async def _close_sdk_stream(res: Any) -> None:
+    """AsyncGenerateContentResponse が握っている受信ストリームを閉じる。
+
+    SDK (google-generativeai) の __aiter__ は res._iterator (gRPC のストリーム) から
+    読み進めるジェネレータで、それを aclose しても _iterator 側は開いたまま残る。
+    公開 API がないため内部属性を直接閉じる (async generator なら aclose、gRPC の call なら cancel)。
+    """
+    inner = getattr(res, "_iterator", None)
+    if inner is None:
+        return
+    try:
+        aclose = getattr(inner, "aclose", None)
+        if aclose is not None:
+            await aclose()
+            return
+        cancel = getattr(inner, "cancel", None)
+        if cancel is not None:
+            cancel()
+    except Exception as e:
+        _LOG.debug("[stream] failed to close SDK stream: %r", e)
+
+
+async def _generate_text_streamed(model: Any, prompt: str, limit: int) -> Tuple[str, Any]:
+    """ストリーミングで生成し、limit + 余裕の文字数に達したら受信を打ち切る。
+
+    上限を超える出力は後段で捨てるだけなので、その分のデコードを待たない。
+    打ち切った場合は最後の句点までに切り詰める。(text, response) を返し、
+    response は usage_metadata の参照に使う。
+    """
+    res = await model.generate_content_async(prompt, stream=True)
+    parts: List[str] = []
+    size = 0
+    truncated = False
+    stream = res.__aiter__()
+    try:
+        async for chunk in stream:
+            try:
+                t = chunk.text
+            except ValueError:
+                # テキストを含まないチャンク (終了理由のみ等)
+                continue
+            parts.append(t)
+            size += len(t)
+            if size >= limit + _STREAM_OVERRUN_CHARS:
+                truncated = True
+                break
+    finally:
+        await stream.aclose()
+        await _close_sdk_stream(res)
+    text = "".join(parts)
+    if truncated:
+        last_period = text.rfind("。")
+        if last_period > 0:
+            text = text[: last_period + 1]
+    return text, res
+
+
 class AIService:
     @staticmethod
     async def generate_position_comment(
@@ -360,112 +637,115 @@ class AIService:
         if not ensure_configured():
             return "APIキーが設定されていません。環境変数 GEMINI_API_KEY を確認してください。"
 
-        # 形勢判定
-        best_cp = None
-        best_move_usi = ""
-        if candidates:
-            top = candidates[0]
-            best_move_usi = top.get("move", "")
-            if top.get("score_mate") is not None:
-                best_cp = 30000 if top["score_mate"] >= 0 else -30000
-            elif top.get("score_cp") is not None:
-                best_cp = top["score_cp"]
-
-        if best_cp is None:
-            situation = "不明"
-        elif abs(best_cp) > 2000:
-            situation = "先手勝勢" if best_cp > 0 else "後手勝勢"
-        elif abs(best_cp) > 800:
-            situation = "先手優勢" if best_cp > 0 else "後手優勢"
-        elif abs(best_cp) > 300:
-            situation = "先手有利" if best_cp > 0 else "後手有利"
-        else:
-            situation = "互角"
-
-        # 指し手の評価
-        good_or_bad = "普通"
-        if delta_cp is not None:
-            if delta_cp <= -150:
-                good_or_bad = "悪手"
-            elif delta_cp <= -50:
-                good_or_bad = "疑問手"
-            elif delta_cp >= 150:
-                good_or_bad = "好手"
-
-        # 日本語ラベル
-        turn = _detect_turn(sfen)
-        best_move_jp = ShogiUtils.format_move_label(best_move_usi, turn) if best_move_usi else "なし"
-        user_move_jp = ShogiUtils.format_move_label(user_move, turn) if user_move else "なし"
+        prompt, style = _build_position_comment_prompt(
+            ply=ply, sfen=sfen, candidates=candidates, user_move=user_move,
+            delta_cp=delta_cp, features=features, style=style,
+        )
 
-        # 特徴量ブロック
-        features_block = build_features_block(features) if features else ""
+        async def _produce() -> str:
+            # 短文生成には 2.5-flash-lite を固定（2.5-flash の thinking モードが tokens を消費するため）
+            model = get_generative_model("gemini-2.5-flash-lite", max_output_tokens=120)
+            text, res = await _generate_text_streamed(model, prompt, limit=80)
+            tokens_info = None
+            try:
+                if hasattr(res, 'usage_metadata') and res.usage_metadata:
+                    meta = res.usage_metadata
+                    tokens_info = {"prompt": meta.prompt_token_count, "completion": meta.candidates_token_count}
+                    _LOG.info(
+                        "[TokenUsage] %s - input: %d, output: %d, total: %d",
+                        "generate_position_comment",
+                        meta.prompt_token_count,
+                        meta.candidates_token_count,
+                        meta.total_token_count,
+                    )
+                else:
+                    _LOG.warning("[TokenUsage] %s - usage_metadata not available", "generate_position_comment")
+            except Exception:
+                _LOG.warning("[TokenUsage] %s - failed to read usage_metadata", "generate_position_comment")
 
-        # 盤面分析ブロック (BoardAnalyzer)
-        board_analysis_block = ""
-        try:
-            from backend.api.services.board_analyzer import BoardAnalyzer
-            analysis = BoardAnalyzer().analyze(
-                position_cmd=sfen,
-                move=user_move,
-                ply=ply,
-            )
-            board_analysis_block = build_board_analysis_block(analysis)
-        except Exception:
-            _LOG.debug("[explain] BoardAnalyzer failed, continuing without board analysis")
+            # Fire-and-forget training log
+            asyncio.ensure_future(_log_explanation(
+                sfen=sfen, ply=ply, candidates=candidates,
+                user_move=user_move, delta_cp=delta_cp, features=features,
+                explanation=text, model_name="gemini-2.5-flash-lite",
+                tokens=tokens_info, style=style,
+            ))
 
-        # スタイル選択
-        if style is None and features:
-            style = _get_style_selector().predict(features)
-        style = style or "neutral"
-        style_instruction = _STYLE_INSTRUCTIONS.get(style, _STYLE_INSTRUCTIONS["neutral"])
+            return text
 
-        prompt = f"""あなたは将棋の局面解説AIです。
-以下の局面について、80文字以内で解説してください。
+        # 同一プロンプトの同時リクエストは1回の LLM 呼び出しにまとめる
+        return await _single_flight(_COMMENT_INFLIGHT, prompt, _produce)
 
-手数: {ply}手目
-指された手: {user_move_jp}（この手の評価: {good_or_bad}）
-AI推奨手: {best_move_jp}
-形勢: {situation}
-{features_block}{board_analysis_block}
-トーン: {style_instruction}
-ルール:
-- 80文字以内で完結すること
-- 地の文のみ。箇条書き・見出し・記号禁止
-- です/ます調
-- 文章を途中で切らないこと"""
+    @staticmethod
+    async def generate_position_comment_batch(
+        requests: List[Dict[str, Any]],
+    ) -> List[Any]:
+        """複数局面のレガシー解説を1回の LLM リクエストでまとめて生成する.
+
+        requests の各要素は generate_position_comment のキーワード引数。
+        指示とルールは1回だけ書き、局面ごとの情報を行として並べる。
+        _COMMENT_BATCH_MAX_ROWS 件を超える分は別リクエストに分けて並行に投げる。
+        応答が件数どおりにパースできない場合は1件ずつの呼び出しにフォールバックし、
+        その際に失敗した要素は例外オブジェクトのまま返す。
+        """
+        if len(requests) == 1:
+            return [await AIService.generate_position_comment(**requests[0])]
+        if not ensure_configured():
+            return ["APIキーが設定されていません。環境変数 GEMINI_API_KEY を確認してください。"] * len(requests)
+        if len(requests) > _COMMENT_BATCH_MAX_ROWS:
+            chunks = [
+                requests[i:i + _COMMENT_BATCH_MAX_ROWS]
+                for i in range(0, len(requests), _COMMENT_BATCH_MAX_ROWS)
+            ]
+            results = await asyncio.gather(
+                *(AIService.generate_position_comment_batch(c) for c in chunks)
+            )
+            return [r for chunk in results for r in chunk]
 
-        # 短文生成には 2.5-flash-lite を固定（2.5-flash の thinking モードが tokens を消費するため）
-        model = genai.GenerativeModel(
+        prepared = [_build_position_comment_row(**r) for r in requests]
+        model = get_generative_model(
             "gemini-2.5-flash-lite",
-            generation_config=genai.types.GenerationConfig(max_output_tokens=300),
+            max_output_tokens=300 * len(requests),
+            response_mime_type="application/json",
         )
-        res = await model.generate_content_async(prompt)
+        texts = None
+        res = None
+        try:
+            res = await model.generate_content_async(_build_batch_prompt([p for p, _ in prepared]))
+            texts = _parse_batch_texts(res.text, len(requests))
+        except Exception as e:
+            _LOG.warning("[explain] batched comment failed: %s", e)
+        if texts is None:
+            _LOG.warning("[explain] batched comment unusable, falling back to %d single calls", len(requests))
+            return list(await asyncio.gather(
+                *(AIService.generate_position_comment(**r) for r in requests),
+                return_exceptions=True,
+            ))
+
         tokens_info = None
         try:
             if hasattr(res, 'usage_metadata') and res.usage_metadata:
                 meta = res.usage_metadata
                 tokens_info = {"prompt": meta.prompt_token_count, "completion": meta.candidates_token_count}
                 _LOG.info(
-                    "[TokenUsage] %s - input: %d, output: %d, total: %d",
-                    "generate_position_comment",
+                    "[TokenUsage] %s - input: %d, output: %d, total: %d (batch=%d)",
+                    "generate_position_comment_batch",
                     meta.prompt_token_count,
                     meta.candidates_token_count,
                     meta.total_token_count,
+                    len(requests),
                 )
-            else:
-                _LOG.warning("[TokenUsage] %s - usage_metadata not available", "generate_position_comment")
         except Exception:
-            _LOG.warning("[TokenUsage] %s - failed to read usage_metadata", "generate_position_comment")
-
-        # Fire-and-forget training log
-        asyncio.ensure_future(_log_explanation(
-            sfen=sfen, ply=ply, candidates=candidates,
-            user_move=user_move, delta_cp=delta_cp, features=features,
-            explanation=res.text, model_name="gemini-2.5-flash-lite",
-            tokens=tokens_info, style=style,
-        ))
-
-        return res.text
+            _LOG.warning("[TokenUsage] %s - failed to read usage_metadata", "generate_position_comment_batch")
+
+        for r, (_, style), text in zip(requests, prepared, texts):
+            asyncio.ensure_future(_log_explanation(
+                sfen=r["sfen"], ply=r["ply"], candidates=r["candidates"],
+                user_move=r["user_move"], delta_cp=r["delta_cp"], features=r.get("features"),
+                explanation=text, model_name="gemini-2.5-flash-lite",
+                tokens=tokens_info, style=style,
+            ))
+        return texts
 
     @staticmethod
     async def generate_planned_comment(
@@ -551,65 +831,73 @@ AI推奨手: {best_move_jp}
 - です/ます調
 - 文章を途中で切らないこと"""
 
-        # 6. LLM呼び出し
-        model = genai.GenerativeModel(
-            "gemini-2.5-flash-lite",
-            generation_config=genai.types.GenerationConfig(max_output_tokens=300),
-        )
-        try:
-            res = await model.generate_content_async(prompt)
-        except Exception as e:
-            _LOG.warning("[planned_comment] LLM call failed: %s", e)
-            explanation = _build_planned_fallback(plan)
+        async def _produce() -> Dict[str, Any]:
+            # 6. LLM呼び出し (クライアント側の枠を超えていればテンプレート生成)
+            if await _GEMINI_BUDGET.acquire():
+                return {
+                    "explanation": _build_planned_fallback(plan),
+                    "style": style,
+                    "plan": plan.to_dict(),
+                    "is_fallback": True,
+                }
+            model = get_generative_model("gemini-2.5-flash-lite", max_output_tokens=120)
+            try:
+                raw_text, res = await _generate_text_streamed(model, prompt, limit=80)
+            except Exception as e:
+                _LOG.warning("[planned_comment] LLM call failed: %s", e)
+                explanation = _build_planned_fallback(plan)
+                return {
+                    "explanation": explanation,
+                    "style": style,
+                    "plan": plan.to_dict(),
+                    "is_fallback": True,
+                }
+
+            tokens_info = None
+            try:
+                if hasattr(res, 'usage_metadata') and res.usage_metadata:
+                    meta = res.usage_metadata
+                    tokens_info = {"prompt": meta.prompt_token_count, "completion": meta.candidates_token_count}
+                    _LOG.info(
+                        "[TokenUsage] %s - input: %d, output: %d, total: %d",
+                        "generate_planned_comment",
+                        meta.prompt_token_count,
+                        meta.candidates_token_count,
+                        meta.total_token_count,
+                    )
+            except Exception:
+                pass
+
+            # 7. 後処理: 改行・記号除去、80文字制限、空文字ガード
+            text = _sanitize_explanation(raw_text, plan)
+            # fallback 判定: sanitize で fallback テキストに差し替えた場合
+            used_fallback = (len(raw_text.strip()) < 5)
+
+            # 8. Fire-and-forget training log
+            # features は数値特徴量のまま維持、plan は別フィールド
+            try:
+                log_features = extract_position_features(sfen=sfen, move=user_move, ply=ply)
+            except Exception:
+                log_features = None
+            asyncio.ensure_future(_log_explanation(
+                sfen=sfen, ply=ply, candidates=candidates,
+                user_move=user_move, delta_cp=delta_cp,
+                features=log_features,
+                explanation=text, model_name="gemini-2.5-flash-lite",
+                tokens=tokens_info, style=style,
+                plan=plan.to_dict(),
+            ))
+
             return {
-                "explanation": explanation,
+                "explanation": text,
                 "style": style,
                 "plan": plan.to_dict(),
-                "is_fallback": True,
+                "is_fallback": used_fallback,
             }
 
-        tokens_info = None
-        try:
-            if hasattr(res, 'usage_metadata') and res.usage_metadata:
-                meta = res.usage_metadata
-                tokens_info = {"prompt": meta.prompt_token_count, "completion": meta.candidates_token_count}
-                _LOG.info(
-                    "[TokenUsage] %s - input: %d, output: %d, total: %d",
-                    "generate_planned_comment",
-                    meta.prompt_token_count,
-                    meta.candidates_token_count,
-                    meta.total_token_count,
-                )
-        except Exception:
-            pass
-
-        # 7. 後処理: 改行・記号除去、80文字制限、空文字ガード
-        raw_text = getattr(res, "text", None) or ""
-        text = _sanitize_explanation(raw_text, plan)
-        # fallback 判定: sanitize で fallback テキストに差し替えた場合
-        used_fallback = (len(raw_text.strip()) < 5)
-
-        # 8. Fire-and-forget training log
-        # features は数値特徴量のまま維持、plan は別フィールド
-        try:
-            log_features = extract_position_features(sfen=sfen, move=user_move, ply=ply)
-        except Exception:
-            log_features = None
-        asyncio.ensure_future(_log_explanation(
-            sfen=sfen, ply=ply, candidates=candidates,
-            user_move=user_move, delta_cp=delta_cp,
-            features=log_features,
-            explanation=text, model_name="gemini-2.5-flash-lite",
-            tokens=tokens_info, style=style,
-            plan=plan.to_dict(),
-        ))
-
-        return {
-            "explanation": text,
-            "style": style,
-            "plan": plan.to_dict(),
-            "is_fallback": used_fallback,
-        }
+        # 同一プロンプトの同時リクエストは1回の LLM 呼び出し・学習ログにまとめる
+        # (呼び出し側が結果 dict を書き換えても共有されないよう浅いコピーを返す)
+        return dict(await _single_flight(_PLANNED_INFLIGHT, prompt, _produce))
 
     @staticmethod
     def build_plan(
@@ -633,6 +921,29 @@ AI推奨手: {best_move_jp}
         )
         return plan.to_dict()
 
+    @staticmethod
+    def get_cached_game_digest(
+        data: Dict[str, Any], cache_key: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """キャッシュ済みのダイジェストがあれば返す (force_llm 時は常に None)。
+
+        キーは特徴量に依存しないので、呼び出し側は特徴量抽出の前に確認できる。
+        """
+        if data.get("force_llm"):
+            return None
+        cache_key = cache_key or _digest_cache_key_for(data)
+        hit = _digest_cache_get(cache_key)
+        if hit is None:
+            return None
+        explanation, limited = hit
+        _LOG.info("[digest] cache_hit rid=%s key=%s", data.get("_request_id") or "n/a", cache_key)
+        return _build_digest_payload(
+            explanation=explanation,
+            source="cache",
+            limited=limited,
+            retry_after=None,
+        )
+
     @staticmethod
     async def generate_game_digest(data: Dict[str, Any]) -> Dict[str, Any]:
         request_id = data.get("_request_id") or "n/a"
@@ -654,155 +965,104 @@ AI推奨手: {best_move_jp}
             initial_turn,
         )
 
-        cache_key = _digest_cache_key(total_moves, eval_history, winner,
-                                      notes=notes, bioshogi=bioshogi,
-                                      sente_name=sente_name, gote_name=gote_name)
-        hit = _digest_cache_get(cache_key)
-        if hit and not force_llm:
-            age = int(time.time() - hit["created_at"])
-            _LOG.info("[digest] cache_hit rid=%s key=%s age=%ss", request_id, cache_key, age)
-            return _build_digest_payload(
-                explanation=hit["explanation"],
-                source="cache",
-                limited=hit.get("limited", False),
-                retry_after=None,
-            )
+        cache_key = _digest_cache_key_for(data)
+        cached = AIService.get_cached_game_digest(data, cache_key=cache_key)
+        if cached is not None:
+            return cached
 
         _LOG.info("[digest] cache_miss rid=%s key=%s", request_id, cache_key)
 
-        force_fallback = os.getenv("FORCE_DIGEST_FALLBACK", "0") == "1"
-        if force_fallback:
-            explanation = _build_fallback_digest(eval_history, total_moves, winner)
-            _digest_cache_set(cache_key, explanation, limited=True)
-            return _build_digest_payload(explanation, source="fallback", limited=True, retry_after=None)
-
-        if not ensure_configured():
-            # Return fallback to keep dev moving.
-            explanation = _build_fallback_digest(eval_history, total_moves, winner)
-            _digest_cache_set(cache_key, explanation, limited=False)
-            return _build_digest_payload(explanation, source="fallback", limited=False, retry_after=None)
-
-        try:
-            step = max(1, len(eval_history) // 20)
-            eval_summary = [f"{i}手:{v}" for i, v in enumerate(eval_history) if i % step == 0]
-
-            # --- bioshogi block ---
-            bio_block = ""
-            if bioshogi:
-                bio_s = bioshogi.get("sente") or {}
-                bio_g = bioshogi.get("gote") or {}
-                s_atk = ", ".join(bio_s.get("attack", []) or []) or "不明"
-                s_def = ", ".join(bio_s.get("defense", []) or []) or "不明"
-                s_tec = ", ".join(bio_s.get("technique", []) or []) or "なし"
-                g_atk = ", ".join(bio_g.get("attack", []) or []) or "不明"
-                g_def = ", ".join(bio_g.get("defense", []) or []) or "不明"
-                g_tec = ", ".join(bio_g.get("technique", []) or []) or "なし"
-                bio_block = (
-                    f"\n【戦型・囲い情報】\n"
-                    f"- {sente_name}（先手）: 戦型={s_atk}, 囲い={s_def}, 手筋={s_tec}\n"
-                    f"- {gote_name}（後手）: 戦型={g_atk}, 囲い={g_def}, 手筋={g_tec}\n"
+        async def _produce() -> Dict[str, Any]:
+            force_fallback = os.getenv("FORCE_DIGEST_FALLBACK", "0") == "1"
+            if force_fallback:
+                explanation = _build_fallback_digest(eval_history, total_moves, winner)
+                _digest_cache_set(cache_key, explanation, limited=True)
+                return _build_digest_payload(explanation, source="fallback", limited=True, retry_after=None)
+
+            if not ensure_configured():
+                # Return fallback to keep dev moving.
+                explanation = _build_fallback_digest(eval_history, total_moves, winner)
+                _digest_cache_set(cache_key, explanation, limited=False)
+                return _build_digest_payload(explanation, source="fallback", limited=False, retry_after=None)
+
+            wait = await _GEMINI_BUDGET.acquire()
+            if wait:
+                # 枠が空くまで数秒なのでキャッシュせず、次のリクエストで LLM を試す
+                _LOG.info("[digest] throttled rid=%s wait=%.1fs", request_id, wait)
+                explanation = _build_fallback_digest(eval_history, total_moves, winner)
+                return _build_digest_payload(
+                    explanation, source="fallback", limited=True, retry_after=max(1, math.ceil(wait)),
                 )
 
-            # --- notable moves block ---
-            # delta_cp は手番プレイヤー視点: 負=悪手, 正=好手
-            # initial_turn='b': 奇数ply=先手(▲), 偶数ply=後手(△)
-            # initial_turn='w': 奇数ply=後手(△), 偶数ply=先手(▲)
-            notes_block = ""
-            if notes:
-                def _is_sente_ply(ply: int) -> bool:
-                    return (ply % 2 != 0) if initial_turn == "b" else (ply % 2 == 0)
-
-                valid_notes = [n for n in notes if isinstance(n.get("delta_cp"), (int, float))]
-                notable = sorted(valid_notes, key=lambda n: abs(n["delta_cp"]), reverse=True)[:5]
-                if notable:
-                    lines = []
-                    for n in notable:
-                        ply = n["ply"]
-                        d = int(n["delta_cp"])
-                        is_sente = _is_sente_ply(ply)
-                        turn = "b" if is_sente else "w"
-                        move_jp = ShogiUtils.format_move_label(n.get("move", ""), turn)
-                        qualifier = "好手" if d >= 150 else ("悪手" if d <= -150 else "普通")
-                        lines.append(f"  - {ply}手目 {move_jp} (Δ{d:+d}cp / {qualifier})")
-                    notes_block = "\n【注目手（評価値変動が大きかった手）】\n" + "\n".join(lines) + "\n"
-
-            # --- digest features block ---
-            digest_feat_block = build_digest_features_block(digest_features)
-
-            prompt = f"""以下の3点を含む200文字以内の文章を出力せよ。
-1. 先手と後手の戦型
-2. 最大の転換点（何手目の何の手）
-3. 勝者と勝因
-
-{sente_name}（先手）vs {gote_name}（後手）、{total_moves}手
-評価値推移: {', '.join(eval_summary)}
-{bio_block}{notes_block}{digest_feat_block}
-例: 石田流 vs 棒金の一局。42手目△7三(82)が悪手となり形勢逆転。先手が中盤以降の優勢を維持し73手で勝利した。
-
-見出し・箇条書き・挨拶文・装飾すべて禁止。地の文のみ。
-【厳守】200文字以内。文章を途中で切らず最後まで完結させること。"""
-            # 短文生成には 2.5-flash-lite を固定（2.5-flash の thinking モードが tokens を消費するため）
-            digest_model = "gemini-2.5-flash-lite"
-            prompt_size = len(prompt)
-            t0 = time.time()
-            _LOG.info("[digest] llm.start rid=%s model=%s prompt_chars=%s", request_id, digest_model, prompt_size)
-            model = genai.GenerativeModel(
-                digest_model,
-                generation_config=genai.types.GenerationConfig(max_output_tokens=1500),
-            )
-            response = await model.generate_content_async(prompt)
-            elapsed_ms = int((time.time() - t0) * 1000)
-            _LOG.info("[digest] llm.ok rid=%s ms=%s", request_id, elapsed_ms)
-            digest_tokens = None
             try:
-                if hasattr(response, 'usage_metadata') and response.usage_metadata:
-                    meta = response.usage_metadata
-                    digest_tokens = {"prompt": meta.prompt_token_count, "completion": meta.candidates_token_count}
-                    _LOG.info(
-                        "[TokenUsage] %s - input: %d, output: %d, total: %d",
-                        "generate_game_digest",
-                        meta.prompt_token_count,
-                        meta.candidates_token_count,
-                        meta.total_token_count,
-                    )
-                else:
-                    _LOG.warning("[TokenUsage] %s - usage_metadata not available", "generate_game_digest")
-            except Exception:
-                _LOG.warning("[TokenUsage] %s - failed to read usage_metadata", "generate_game_digest")
-            explanation = response.text
-
-            # Fire-and-forget training log
-            asyncio.ensure_future(_log_digest(
-                total_moves=total_moves, eval_history_len=len(eval_history),
-                notes_count=len(notes), digest_features_count=len(digest_features),
-                explanation=explanation, model_name=digest_model,
-                tokens=digest_tokens, source="llm",
-            ))
-
-            _digest_cache_set(cache_key, explanation, limited=False)
-            return _build_digest_payload(explanation, source="llm", limited=False, retry_after=None)
-        except gax_exceptions.ResourceExhausted as e:
-            _log_llm_exception("ResourceExhausted", e, data)
-            retry_after = _extract_retry_after_seconds(e)
-            explanation = _build_fallback_digest(eval_history, total_moves, winner)
-            _digest_cache_set(cache_key, explanation, limited=True)
-            return _build_digest_payload(explanation, source="fallback", limited=True, retry_after=retry_after)
-        except gax_exceptions.TooManyRequests as e:
-            _log_llm_exception("TooManyRequests", e, data)
-            retry_after = _extract_retry_after_seconds(e)
-            explanation = _build_fallback_digest(eval_history, total_moves, winner)
-            _digest_cache_set(cache_key, explanation, limited=True)
-            return _build_digest_payload(explanation, source="fallback", limited=True, retry_after=retry_after)
-        except gax_exceptions.GoogleAPICallError as e:
-            _log_llm_exception("GoogleAPICallError", e, data)
-            explanation = _build_fallback_digest(eval_history, total_moves, winner)
-            _digest_cache_set(cache_key, explanation, limited=False)
-            return _build_digest_payload(explanation, source="fallback", limited=False, retry_after=None)
-        except Exception as e:
-            _log_llm_exception(type(e).__name__, e, data)
-            explanation = _build_fallback_digest(eval_history, total_moves, winner)
-            _digest_cache_set(cache_key, explanation, limited=False)
-            return _build_digest_payload(explanation, source="fallback", limited=False, retry_after=None)
+                prompt = _build_digest_prompt(
+                    eval_history, total_moves, notes, bioshogi,
+                    sente_name, gote_name, initial_turn, digest_features,
+                )
+                # 短文生成には 2.5-flash-lite を固定（2.5-flash の thinking モードが tokens を消費するため）
+                digest_model = "gemini-2.5-flash-lite"
+                prompt_size = len(prompt)
+                t0 = time.time()
+                _LOG.info("[digest] llm.start rid=%s model=%s prompt_chars=%s", request_id, digest_model, prompt_size)
+                model = get_generative_model(digest_model, max_output_tokens=400)
+                explanation, response = await _generate_text_streamed(model, prompt, limit=200)
+                elapsed_ms = int((time.time() - t0) * 1000)
+                _LOG.info("[digest] llm.ok rid=%s ms=%s", request_id, elapsed_ms)
+                digest_tokens = None
+                try:
+                    if hasattr(response, 'usage_metadata') and response.usage_metadata:
+                        meta = response.usage_metadata
+                        digest_tokens = {"prompt": meta.prompt_token_count, "completion": meta.candidates_token_count}
+                        _LOG.info(
+                            "[TokenUsage] %s - input: %d, output: %d, total: %d",
+                            "generate_game_digest",
+                            meta.prompt_token_count,
+                            meta.candidates_token_count,
+                            meta.total_token_count,
+                        )
+                    else:
+                        _LOG.warning("[TokenUsage] %s - usage_metadata not available", "generate_game_digest")
+                except Exception:
+                    _LOG.warning("[TokenUsage] %s - failed to read usage_metadata", "generate_game_digest")
+
+                # Fire-and-forget training log
+                asyncio.ensure_future(_log_digest(
+                    total_moves=total_moves, eval_history_len=len(eval_history),
+                    notes_count=len(notes), digest_features_count=len(digest_features),
+                    explanation=explanation, model_name=digest_model,
+                    tokens=digest_tokens, source="llm",
+                ))
+
+                _digest_cache_set(cache_key, explanation, limited=False)
+                return _build_digest_payload(explanation, source="llm", limited=False, retry_after=None)
+            except gax_exceptions.ResourceExhausted as e:
+                _log_llm_exception("ResourceExhausted", e, data)
+                retry_after = _extract_retry_after_seconds(e)
+                explanation = _build_fallback_digest(eval_history, total_moves, winner)
+                _digest_cache_set(cache_key, explanation, limited=True)
+                return _build_digest_payload(explanation, source="fallback", limited=True, retry_after=retry_after)
+            except gax_exceptions.TooManyRequests as e:
+                _log_llm_exception("TooManyRequests", e, data)
+                retry_after = _extract_retry_after_seconds(e)
+                explanation = _build_fallback_digest(eval_history, total_moves, winner)
+                _digest_cache_set(cache_key, explanation, limited=True)
+                return _build_digest_payload(explanation, source="fallback", limited=True, retry_after=retry_after)
+            except gax_exceptions.GoogleAPICallError as e:
+                _log_llm_exception("GoogleAPICallError", e, data)
+                explanation = _build_fallback_digest(eval_history, total_moves, winner)
+                _digest_cache_set(cache_key, explanation, limited=False)
+                return _build_digest_payload(explanation, source="fallback", limited=False, retry_after=None)
+            except Exception as e:
+                _log_llm_exception(type(e).__name__, e, data)
+                explanation = _build_fallback_digest(eval_history, total_moves, winner)
+                _digest_cache_set(cache_key, explanation, limited=False)
+                return _build_digest_payload(explanation, source="fallback", limited=False, retry_after=None)
+
+        if force_llm:
+            return await _produce()
+        # 同一キーの同時リクエストは1回の生成にまとめ、結果を共有する
+        # (呼び出し側が結果 dict を書き換えるので浅いコピーを返す)
+        return dict(await _single_flight(_DIGEST_INFLIGHT, cache_key, _produce))
 
 
 def _digest_cache_key(
@@ -813,42 +1073,90 @@ def _digest_cache_key(
     bioshogi: Optional[dict] = None,
     sente_name: Optional[str] = None,
     gote_name: Optional[str] = None,
+    initial_turn: Optional[str] = None,
+    moves: Optional[List[str]] = None,
 ) -> str:
     # Use condensed note/bioshogi summary to keep key compact
+    # 評価値はプロンプトと同じ 20 点間引き + 25cp 丸めでキーに含める
+    # (ハッシュ量を一定にし、誤差程度しか違わない棋譜でもキャッシュを共有する)
+    step = max(1, len(eval_history) // 20)
+    eh_summary = [(int(v) // 25) * 25 for v in eval_history[::step]]
     bio_s = ((bioshogi or {}).get("sente") or {})
     bio_g = ((bioshogi or {}).get("gote") or {})
     payload = {
         "total_moves": total_moves,
-        "eval_history": eval_history,
+        "eval_history": eh_summary,
         "winner": winner,
         "notes_len": len(notes or []),
         "bio_s_atk": (bio_s.get("attack") or [])[:1],
         "bio_g_atk": (bio_g.get("attack") or [])[:1],
         "sente_name": sente_name,
         "gote_name": gote_name,
+        # 解説文は具体的な手 (「42手目△7三…」) に触れるため、評価値が似ているだけの
+        # 別の棋譜と取り違えないよう、プロンプトに載る注目手と手順そのものもキーに含める
+        "initial_turn": initial_turn,
+        "notable": [
+            (n.get("ply"), n.get("move"), int(n["delta_cp"])) for n in _notable_notes(notes or [])
+        ],
+        "moves": hashlib.blake2b(" ".join(moves).encode(), digest_size=8).hexdigest() if moves else None,
     }
-    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
-    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    raw = fast_json.dumps(payload, sort_keys=True)
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
 
 
-def _digest_cache_get(key: str) -> Optional[Dict[str, Any]]:
-    v = _DIGEST_CACHE.get(key)
-    if not v:
-        return None
-    if time.time() - v["created_at"] > _DIGEST_CACHE_TTL_SEC:
-        _DIGEST_CACHE.pop(key, None)
-        return None
-    return v
+# Gemini 呼び出しの single-flight: キー -> 実行中タスク
+_DIGEST_INFLIGHT: Dict[str, "asyncio.Task[Any]"] = {}
+_COMMENT_INFLIGHT: Dict[str, "asyncio.Task[Any]"] = {}
+_PLANNED_INFLIGHT: Dict[str, "asyncio.Task[Any]"] = {}
+
+
+async def _single_flight(
+    inflight: Dict[str, "asyncio.Task[Any]"],
+    key: str,
+    factory: Callable[[], Awaitable[Any]],
+) -> Any:
+    """同じ key の処理が実行中ならその結果を待ち、なければ factory() を開始する。
+
+    処理は独立したタスクで走るので、先頭の呼び出し元が切断されても
+    後続の待機者と結果のキャッシュ書き込みは影響を受けない。
+    """
+    task = inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        inflight[key] = task
+
+        def _done(t: "asyncio.Task[Any]") -> None:
+            if inflight.get(key) is t:
+                del inflight[key]
+            if not t.cancelled():
+                t.exception()  # 待機者がいなくなっても未取得警告を出さない
+
+        task.add_done_callback(_done)
+    return await asyncio.shield(task)
+
+
+def _digest_cache_key_for(data: Dict[str, Any]) -> str:
+    """generate_game_digest と同じ既定値で data からキャッシュキーを作る。"""
+    return _digest_cache_key(
+        int(data.get("total_moves") or 0),
+        data.get("eval_history") or [],
+        data.get("winner"),
+        notes=data.get("notes") or [],
+        bioshogi=data.get("bioshogi") or {},
+        sente_name=data.get("sente_name") or "先手",
+        gote_name=data.get("gote_name") or "後手",
+        initial_turn=data.get("initial_turn") or "b",
+        moves=data.get("moves") or None,
+    )
+
+
+def _digest_cache_get(key: str) -> Optional[Tuple[str, bool]]:
+    """(explanation, limited) を返す。期限切れ・未登録なら None。"""
+    return _DIGEST_CACHE.get(key)
 
 
 def _digest_cache_set(key: str, explanation: str, limited: bool) -> None:
-    if len(_DIGEST_CACHE) > 500:
-        _DIGEST_CACHE.clear()
-    _DIGEST_CACHE[key] = {
-        "created_at": time.time(),
-        "explanation": explanation,
-        "limited": limited,
-    }
+    _DIGEST_CACHE.set(key, (explanation, limited))
 
 
 def _build_digest_payload(explanation: str, source: str, limited: bool, retry_after: Optional[int]) -> Dict[str, Any]:
@@ -866,18 +1174,95 @@ def _build_digest_payload(explanation: str, source: str, limited: bool, retry_af
     }
 
 
+def _notable_notes(notes: List[dict]) -> List[dict]:
+    """評価値変動 |delta_cp| の大きい順に上位 5 手 (ダイジェストのプロンプトに載せる手)。"""
+    valid_notes = [n for n in notes if isinstance(n.get("delta_cp"), (int, float))]
+    return sorted(valid_notes, key=lambda n: abs(n["delta_cp"]), reverse=True)[:5]
+
+
+def _build_digest_prompt(
+    eval_history: List[int],
+    total_moves: int,
+    notes: List[dict],
+    bioshogi: Dict[str, Any],
+    sente_name: str,
+    gote_name: str,
+    initial_turn: str,
+    digest_features: List[Dict[str, Any]],
+) -> str:
+    """/api/explain/digest 用のプロンプトを組み立てる。"""
+    step = max(1, len(eval_history) // 20)
+    # stride スライスで間引き、残す約 20 点だけを文字列化する
+    eval_summary = [
+        f"{i}手:{v}"
+        for i, v in zip(range(0, len(eval_history), step), eval_history[::step])
+    ]
+
+    # --- bioshogi block ---
+    bio_block = ""
+    if bioshogi:
+        bio_s = bioshogi.get("sente") or {}
+        bio_g = bioshogi.get("gote") or {}
+        s_atk = ", ".join(bio_s.get("attack", []) or []) or "不明"
+        s_def = ", ".join(bio_s.get("defense", []) or []) or "不明"
+        s_tec = ", ".join(bio_s.get("technique", []) or []) or "なし"
+        g_atk = ", ".join(bio_g.get("attack", []) or []) or "不明"
+        g_def = ", ".join(bio_g.get("defense", []) or []) or "不明"
+        g_tec = ", ".join(bio_g.get("technique", []) or []) or "なし"
+        bio_block = (
+            f"\n【戦型・囲い情報】\n"
+            f"- {sente_name}（先手）: 戦型={s_atk}, 囲い={s_def}, 手筋={s_tec}\n"
+            f"- {gote_name}（後手）: 戦型={g_atk}, 囲い={g_def}, 手筋={g_tec}\n"
+        )
+
+    # --- notable moves block ---
+    # delta_cp は手番プレイヤー視点: 負=悪手, 正=好手
+    # initial_turn='b': 奇数ply=先手(▲), 偶数ply=後手(△)
+    # initial_turn='w': 奇数ply=後手(△), 偶数ply=先手(▲)
+    notes_block = ""
+    if notes:
+        # 先手が指す ply の偶奇 (initial_turn='b' なら奇数)
+        sente_parity = 1 if initial_turn == "b" else 0
+        notable = _notable_notes(notes)
+        if notable:
+            lines = []
+            for n in notable:
+                ply = n["ply"]
+                d = int(n["delta_cp"])
+                turn = "b" if (int(ply) & 1) == sente_parity else "w"
+                move_jp = ShogiUtils.format_move_label(n.get("move", ""), turn)
+                qualifier = "好手" if d >= 150 else ("悪手" if d <= -150 else "普通")
+                lines.append(f"  - {ply}手目 {move_jp} (Δ{d:+d}cp / {qualifier})")
+            notes_block = "\n【注目手（評価値変動が大きかった手）】\n" + "\n".join(lines) + "\n"
+
+    # --- digest features block ---
+    digest_feat_block = build_digest_features_block(digest_features)
+
+    return f"""以下の3点を含む200文字以内の文章を出力せよ。
+1. 先手と後手の戦型
+2. 最大の転換点（何手目の何の手）
+3. 勝者と勝因
+
+{sente_name}（先手）vs {gote_name}（後手）、{total_moves}手
+評価値推移: {', '.join(eval_summary)}
+{bio_block}{notes_block}{digest_feat_block}
+例: 石田流 vs 棒金の一局。42手目△7三(82)が悪手となり形勢逆転。先手が中盤以降の優勢を維持し73手で勝利した。
+
+見出し・箇条書き・挨拶文・装飾すべて禁止。地の文のみ。
+【厳守】200文字以内。文章を途中で切らず最後まで完結させること。"""
+
+
 def _build_fallback_digest(eval_history: List[int], total_moves: int, winner: Optional[str]) -> str:
     if not eval_history:
         return "評価値データがないため簡易レポートを生成できませんでした。"
 
-    n = len(eval_history)
+    arr = np.asarray(eval_history, dtype=np.int64)
+    n = arr.size
     thirds = max(1, n // 3)
-    opening = eval_history[:thirds]
-    middle = eval_history[thirds : 2 * thirds]
-    endgame = eval_history[2 * thirds :]
 
-    def avg(xs: List[int]) -> float:
-        return sum(xs) / max(1, len(xs))
+    def avg(xs: np.ndarray) -> float:
+        # 整数のまま合計してから割る (Python の sum / len と同じ値になる)
+        return int(xs.sum()) / max(1, xs.size)
 
     def trend_label(v: float) -> str:
         if v > 150:
@@ -886,18 +1271,21 @@ def _build_fallback_digest(eval_history: List[int], total_moves: int, winner: Op
             return "後手優勢"
         return "互角"
 
-    open_avg = avg(opening)
-    mid_avg = avg(middle)
-    end_avg = avg(endgame)
-
-    # 最大変動点
-    diffs = [eval_history[i] - eval_history[i - 1] for i in range(1, n)]
-    max_up = max(diffs) if diffs else 0
-    max_down = min(diffs) if diffs else 0
-    up_idx = diffs.index(max_up) + 1 if diffs else 0
-    down_idx = diffs.index(max_down) + 1 if diffs else 0
+    open_avg = avg(arr[:thirds])
+    mid_avg = avg(arr[thirds : 2 * thirds])
+    end_avg = avg(arr[2 * thirds :])
+
+    # 最大変動点 (argmax/argmin は最初の出現位置を返す)
+    diffs = np.diff(arr)
+    if diffs.size:
+        up_i = int(diffs.argmax())
+        down_i = int(diffs.argmin())
+        max_up, max_down = int(diffs[up_i]), int(diffs[down_i])
+        up_idx, down_idx = up_i + 1, down_i + 1
+    else:
+        max_up = max_down = up_idx = down_idx = 0
 
-    avg_abs = sum(abs(d) for d in diffs) / max(1, len(diffs))
+    avg_abs = int(np.abs(diffs).sum()) / max(1, diffs.size)
     stability = "安定" if avg_abs < 80 else "変動大きめ"
 
     lines = []
@@ -936,10 +1324,13 @@ def _extract_error_body(err: Exception) -> str:
     return ""
 
 
+_RETRY_AFTER_RE = re.compile(r"retry in\s+([0-9]+(?:\.[0-9]+)?)s", re.IGNORECASE)
+
+
 def _extract_retry_after_seconds(err: Exception) -> Optional[int]:
     # Try to parse retry delay from exception message (e.g. "Please retry in 49.1s")
     msg = str(err)
-    m = re.search(r"retry in\s+([0-9]+(?:\.[0-9]+)?)s", msg, re.IGNORECASE)
+    m = _RETRY_AFTER_RE.search(msg)
     if not m:
         return None
     try:
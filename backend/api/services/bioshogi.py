@@ -4,14 +4,45 @@ bioshogi_service (Ruby/Sinatra) への HTTP クライアント
 from __future__ import annotations
 import logging
 import os
+import threading
 import httpx
 
 _LOG = logging.getLogger("uvicorn.error")
 from typing import Optional
 from pydantic import BaseModel
 
+from backend.api.utils import fast_json
+
 BIOSHOGI_URL = os.getenv("BIOSHOGI_URL", "http://localhost:7070")
 
+# 接続を使い回すクライアント (初回利用時に生成、close() で破棄)
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def _get_client() -> httpx.Client:
+    global _client
+    client = _client
+    if client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(
+                    base_url=BIOSHOGI_URL,
+                    timeout=httpx.Timeout(10.0, connect=2.0),
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+                )
+            client = _client
+    return client
+
+
+def close() -> None:
+    """共有クライアントを閉じる (lifespan の shutdown から呼ぶ)。"""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
 
 class BioshogiPlayer(BaseModel):
     player: int
@@ -30,13 +61,9 @@ class BioshogiResult(BaseModel):
 def analyze_kifu(kifu: str) -> BioshogiResult:
     """棋譜文字列をbioshogiに送って戦型・囲い・手筋を取得"""
     try:
-        resp = httpx.post(
-            f"{BIOSHOGI_URL}/analyze",
-            json={"kifu": kifu},
-            timeout=10.0,
-        )
+        resp = _get_client().post("/analyze", json={"kifu": kifu})
         resp.raise_for_status()
-        return BioshogiResult(**resp.json())
+        return BioshogiResult.model_validate(fast_json.loads(resp.content))
     except Exception:
         _LOG.exception("[bioshogi] analyze_kifu error")
         return BioshogiResult(ok=False, error="bioshogi接続エラー")
@@ -45,7 +72,7 @@ def analyze_kifu(kifu: str) -> BioshogiResult:
 def is_available() -> bool:
     """bioshogiサービスが起動しているか確認"""
     try:
-        resp = httpx.get(f"{BIOSHOGI_URL}/health", timeout=2.0)
+        resp = _get_client().get("/health", timeout=2.0)
         return resp.status_code == 200
     except Exception:
         return False
\ No newline at end of file
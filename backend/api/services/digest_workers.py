@@ -0,0 +1,85 @@
+"""
+backend/api/services/digest_workers.py
+/api/explain/digest の生成処理を固定数のワーカーで捌くプール。
+
+ハンドラはジョブ (引数なしのコルーチン関数) を submit し、lifespan で起動した
+run() 配下の N 個のワーカーがキューから取り出して実行する。同時に走る
+特徴量抽出 + LLM 呼び出しが N 件に抑えられ、アクセス集中時も Gemini へ
+一斉にリクエストが飛ばない (超過分はキューで待つ)。
+run() が動いていない場合は running が False になり、呼び出し側は直接実行する。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+_LOG = logging.getLogger("uvicorn.error")
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(os.getenv(key, str(default)) or str(default))
+    except Exception:
+        return default
+
+
+_Job = Tuple[Callable[[], Awaitable[Any]], "asyncio.Future[Any]"]
+
+
+class DigestWorkerPool:
+    def __init__(self, num_workers: int):
+        self.num_workers = max(1, num_workers)
+        self._queue: Optional["asyncio.Queue[_Job]"] = None
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    async def submit(self, job: Callable[[], Awaitable[Any]]) -> Any:
+        """job() をワーカーで実行し、その結果を返す。"""
+        fut: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, fut))
+        return await fut
+
+    async def run(self) -> None:
+        """ワーカー群を起動して待機する。lifespan から一度だけ起動する。"""
+        queue: "asyncio.Queue[_Job]" = asyncio.Queue()
+        self._queue = queue
+        workers: List["asyncio.Task[None]"] = [
+            asyncio.create_task(self._worker(queue)) for _ in range(self.num_workers)
+        ]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            self._queue = None
+            for w in workers:
+                w.cancel()
+            while not queue.empty():
+                _, fut = queue.get_nowait()
+                if not fut.done():
+                    fut.set_exception(RuntimeError("digest worker pool stopped"))
+
+    @staticmethod
+    async def _worker(queue: "asyncio.Queue[_Job]") -> None:
+        while True:
+            job, fut = await queue.get()
+            # クライアント切断などで既にキャンセル済みなら実行しない
+            if fut.done():
+                continue
+            try:
+                result = await job()
+            except asyncio.CancelledError:
+                if not fut.done():
+                    fut.cancel()
+                raise
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            else:
+                if not fut.done():
+                    fut.set_result(result)
+
+
+digest_workers = DigestWorkerPool(num_workers=_env_int("DIGEST_WORKERS", 8))
@@ -19,12 +19,14 @@ from __future__ import annotations
 
 import asyncio
 import os
-import re
 import sys
 import threading
 import time
 from typing import Any, Dict, List, Optional
 
+# info 行のパーサは StreamEngine / BatchEngine と共通
+from backend.api.engine_state import parse_usi_info as _parse_info_line
+
 # .env を手動ロード（dotenv に依存しない）
 _ENV_PATH = os.path.join(
     os.path.dirname(__file__), "..", "..", "..", ".env"
@@ -41,7 +43,6 @@ if os.path.exists(_ENV_PATH):
 ENGINE_CMD = os.getenv("ENGINE_CMD", "/usr/local/bin/yaneuraou")
 ENGINE_WORK_DIR = os.getenv("ENGINE_WORK_DIR", os.path.dirname(ENGINE_CMD) or "/usr/local/bin")
 EVAL_DIR = os.getenv("ENGINE_EVAL_DIR", "")
-SCORE_SCALE = 0.7
 
 
 class AnalysisResult:
@@ -84,34 +85,6 @@ class AnalysisResult:
         )
 
 
-def _parse_info_line(line: str) -> Optional[Dict[str, Any]]:
-    """USI info 行をパースする (engine_state.parse_usi_info と同等ロジック)."""
-    if "score" not in line or "pv" not in line:
-        return None
-    try:
-        data: Dict[str, Any] = {"multipv": 1}
-        mp = re.search(r"multipv\s+(\d+)", line)
-        if mp:
-            data["multipv"] = int(mp.group(1))
-        sc = re.search(
-            r"score\s+(cp|mate)\s+(?:lowerbound\s+|upperbound\s+)?([\+\-]?\d+)", line
-        )
-        if sc:
-            kind = sc.group(1)
-            val = int(sc.group(2))
-            if kind == "cp":
-                val = int(val * SCORE_SCALE)
-            data["score"] = {"type": kind, ("cp" if kind == "cp" else "mate"): val}
-        else:
-            return None
-        pv = re.search(r" pv\s+(.*)", line)
-        if pv:
-            data["pv"] = pv.group(1).strip()
-        return data
-    except Exception:
-        return None
-
-
 class EngineAnalysisService:
     """同期コンテキストから USI エンジンを使って局面解析する.
 
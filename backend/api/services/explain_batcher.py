@@ -0,0 +1,107 @@
+"""
+backend/api/services/explain_batcher.py
+/api/explain (レガシー方式) の LLM 呼び出しを動的バッチ化する。
+
+ハンドラは (kwargs, Future) をキューに積み、lifespan で起動した run() が
+最大 max_batch_size 件 / max_delay 秒まで集めて
+AIService.generate_position_comment_batch に1回で渡し、結果を Future へ返す。
+run() が動いていない場合 (テストや lifespan なしの起動) は running が False になり、
+呼び出し側は従来どおり1件ずつ呼ぶ。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.api.services.ai_service import AIService
+
+_LOG = logging.getLogger("uvicorn.error")
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(os.getenv(key, str(default)) or str(default))
+    except Exception:
+        return default
+
+
+_Item = Tuple[Dict[str, Any], "asyncio.Future[str]"]
+
+
+class ExplainBatcher:
+    def __init__(self, max_batch_size: int, max_delay: float):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay = max(0.0, max_delay)
+        self._queue: Optional["asyncio.Queue[_Item]"] = None
+
+    @property
+    def running(self) -> bool:
+        return self._queue is not None
+
+    async def submit(self, **kwargs: Any) -> str:
+        """generate_position_comment と同じ引数を受け取り、バッチ経由で解説文を返す。"""
+        fut: "asyncio.Future[str]" = asyncio.get_running_loop().create_future()
+        await self._queue.put((kwargs, fut))
+        return await fut
+
+    async def run(self) -> None:
+        """キューを捌くサーバーループ。lifespan から一度だけ起動する。"""
+        queue: "asyncio.Queue[_Item]" = asyncio.Queue()
+        self._queue = queue
+        loop = asyncio.get_running_loop()
+        # イベントループはタスクを弱参照でしか持たないので、送信中タスクはここで保持する
+        dispatching: "set[asyncio.Task[None]]" = set()
+        try:
+            while True:
+                batch: List[_Item] = [await queue.get()]
+                deadline = loop.time() + self.max_delay
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                # LLM 待ちの間も次のバッチを集められるよう、送信は別タスクで行う
+                task = asyncio.create_task(self._dispatch(batch))
+                dispatching.add(task)
+                task.add_done_callback(dispatching.discard)
+        finally:
+            self._queue = None
+            for task in list(dispatching):
+                task.cancel()
+            await asyncio.gather(*dispatching, return_exceptions=True)
+            while not queue.empty():
+                _, fut = queue.get_nowait()
+                if not fut.done():
+                    fut.set_exception(RuntimeError("explain batcher stopped"))
+
+    async def _dispatch(self, batch: List[_Item]) -> None:
+        try:
+            results = await AIService.generate_position_comment_batch([kw for kw, _ in batch])
+        except asyncio.CancelledError:
+            # run() の停止で打ち切られた場合も待っている呼び出し側を解放する
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(RuntimeError("explain batcher stopped"))
+            raise
+        except Exception as e:
+            _LOG.warning("[explain_batcher] batch of %d failed: %s", len(batch), e)
+            results = [e] * len(batch)
+        for (_, fut), result in zip(batch, results):
+            # クライアント切断などで既にキャンセル済みの Future は捨てる
+            if fut.done():
+                continue
+            if isinstance(result, BaseException):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+
+explain_batcher = ExplainBatcher(
+    max_batch_size=_env_int("EXPLAIN_BATCH_MAX_SIZE", 8),
+    max_delay=_env_int("EXPLAIN_BATCH_MAX_DELAY_MS", 20) / 1000.0,
+)
@@ -5,34 +5,48 @@ Gemini API不使用。pure Python で解説テキストの品質を定量評価
 """
 from __future__ import annotations
 
-import json
 import os
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, FrozenSet, List, Optional
+
+import numpy as np
+
+from backend.api.utils import fast_json
 
 # ---------------------------------------------------------------------------
 # 定数: 将棋用語・パターン
 # ---------------------------------------------------------------------------
-_PIECE_NAMES = {"歩", "香", "桂", "銀", "金", "角", "飛", "玉", "王",
-                "と", "成香", "成桂", "成銀", "馬", "龍", "竜"}
+_PIECE_NAMES = frozenset({"歩", "香", "桂", "銀", "金", "角", "飛", "玉", "王",
+                          "と", "成香", "成桂", "成銀", "馬", "龍", "竜"})
 
-_STRATEGY_TERMS = {
+_STRATEGY_TERMS = frozenset({
     "居飛車", "振り飛車", "中飛車", "四間飛車", "三間飛車", "向かい飛車",
     "矢倉", "美濃", "穴熊", "雁木", "角換わり", "相掛かり", "横歩取り",
     "石田流", "藤井システム", "棒銀", "棒金", "右四間", "急戦", "持久戦",
-}
+})
+
+_ATTACK_WORDS = frozenset({"攻め", "攻撃", "狙い", "迫る", "寄せ", "王手", "詰み",
+                           "突破", "仕掛け", "殺到", "踏み込"})
+
+_DEFENSE_WORDS = frozenset({"守り", "守る", "受け", "固める", "囲い", "備え", "耐え",
+                            "しのぐ", "受ける", "防ぐ", "安定"})
+
+_OPENING_WORDS = frozenset({"序盤", "駒組み", "陣形", "構え", "布陣", "展開"})
+_ENDGAME_WORDS = frozenset({"終盤", "寄せ", "詰み", "入玉", "必至", "詰めろ", "秒読み"})
 
-_ATTACK_WORDS = {"攻め", "攻撃", "狙い", "迫る", "寄せ", "王手", "詰み",
-                 "突破", "仕掛け", "殺到", "踏み込"}
+_CONNECTORS = frozenset({"しかし", "一方", "また", "そして", "ただし", "そのため",
+                         "なぜなら", "つまり", "さらに", "ところが", "むしろ"})
 
-_DEFENSE_WORDS = {"守り", "守る", "受け", "固める", "囲い", "備え", "耐え",
-                  "しのぐ", "受ける", "防ぐ", "安定"}
 
-_OPENING_WORDS = {"序盤", "駒組み", "陣形", "構え", "布陣", "展開"}
-_ENDGAME_WORDS = {"終盤", "寄せ", "詰み", "入玉", "必至", "詰めろ", "秒読み"}
+def _terms_re(terms: FrozenSet[str]) -> "re.Pattern[str]":
+    """語彙のいずれかに一致する正規表現 (出現判定を語ごとの `in` ではなく1回の走査で行う)."""
+    return re.compile("|".join(map(re.escape, sorted(terms, key=len, reverse=True))))
 
-_CONNECTORS = {"しかし", "一方", "また", "そして", "ただし", "そのため",
-               "なぜなら", "つまり", "さらに", "ところが", "むしろ"}
+
+_ATTACK_RE = _terms_re(_ATTACK_WORDS)
+_DEFENSE_RE = _terms_re(_DEFENSE_WORDS)
+_OPENING_RE = _terms_re(_OPENING_WORDS)
+_ENDGAME_RE = _terms_re(_ENDGAME_WORDS)
 
 _MOVE_PATTERN = re.compile(r"[▲△☗☖][１-９1-9一二三四五六七八九]")
 _NUMBER_PATTERN = re.compile(r"\d+[点手目cp]")
@@ -66,26 +80,18 @@ def score_context_relevance(
     # --- phase 整合性 ---
     if phase == "opening":
         # 序盤なのに終盤語があれば減点
-        for w in _ENDGAME_WORDS:
-            if w in text:
-                score -= 10
-                break
+        if _ENDGAME_RE.search(text):
+            score -= 10
         # 序盤語があれば加点
-        for w in _OPENING_WORDS:
-            if w in text:
-                score += 10
-                break
+        if _OPENING_RE.search(text):
+            score += 10
 
     elif phase == "endgame":
         # 終盤なのに序盤語があれば減点
-        for w in _OPENING_WORDS:
-            if w in text:
-                score -= 10
-                break
-        for w in _ENDGAME_WORDS:
-            if w in text:
-                score += 10
-                break
+        if _OPENING_RE.search(text):
+            score -= 10
+        if _ENDGAME_RE.search(text):
+            score += 10
 
     elif phase == "midgame":
         # 中盤は許容範囲が広い → 軽い加点のみ
@@ -94,14 +100,14 @@ def score_context_relevance(
 
     # --- intent 整合性 ---
     if intent == "attack":
-        has_attack = any(w in text for w in _ATTACK_WORDS)
+        has_attack = _ATTACK_RE.search(text) is not None
         if has_attack:
             score += 15
         else:
             score -= 10
 
     elif intent == "defense":
-        has_defense = any(w in text for w in _DEFENSE_WORDS)
+        has_defense = _DEFENSE_RE.search(text) is not None
         if has_defense:
             score += 15
         else:
@@ -312,12 +318,12 @@ def evaluate_training_logs(log_dir: str) -> Dict[str, Any]:
             continue
         path = os.path.join(log_dir, name)
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                for line in f:
-                    line = line.strip()
-                    if not line:
+            # バイナリのまま1行ずつ JSON パーサに渡す (decode / strip の中間文字列を作らない)
+            with open(path, "rb") as f:
+                for raw in f:
+                    if raw.isspace():
                         continue
-                    obj = json.loads(line)
+                    obj = fast_json.loads(raw)
                     explanation = (obj.get("output") or {}).get("explanation", "")
                     features = (obj.get("input") or {}).get("features")
                     if explanation:
@@ -328,31 +334,39 @@ def evaluate_training_logs(log_dir: str) -> Dict[str, Any]:
     if not records:
         return {"total_records": 0}
 
-    all_evals: List[Dict[str, Any]] = []
-    by_phase: Dict[str, List[float]] = {}
-    by_intent: Dict[str, List[float]] = {}
-
-    for r in records:
+    # スコアは数値配列に詰めて集計する。total は小数1桁なので 10 倍の整数で持ち、
+    # 合計・グループ平均を丸め誤差なしで求める
+    n = len(records)
+    total_x10 = np.empty(n, dtype=np.int64)
+    axis_scores = np.empty((n, len(_WEIGHTS)), dtype=np.int16)
+    phase_codes = np.empty(n, dtype=np.intp)
+    intent_codes = np.empty(n, dtype=np.intp)
+    phase_ids: Dict[Any, int] = {}
+    intent_ids: Dict[Any, int] = {}
+
+    for i, r in enumerate(records):
         ev = evaluate_explanation(r["explanation"], r["features"])
-        all_evals.append(ev)
+        total_x10[i] = round(ev["total"] * 10)
+        axis_scores[i] = [ev["scores"][axis] for axis in _WEIGHTS]
 
         phase = (r["features"] or {}).get("phase", "unknown")
         intent = (r["features"] or {}).get("move_intent", "unknown")
+        phase_codes[i] = phase_ids.setdefault(phase, len(phase_ids))
+        intent_codes[i] = intent_ids.setdefault(intent, len(intent_ids))
 
-        by_phase.setdefault(phase, []).append(ev["total"])
-        by_intent.setdefault(intent, []).append(ev["total"])
+    avg_total = round(int(total_x10.sum()) / (10 * n), 1)
+    low_quality = int((total_x10 < 400).sum())
 
-    totals = [e["total"] for e in all_evals]
-    avg_total = round(sum(totals) / len(totals), 1)
-    low_quality = sum(1 for t in totals if t < 40)
+    axis_sums = axis_scores.sum(axis=0, dtype=np.int64).tolist()
+    avg_scores = {axis: round(s / n, 1) for axis, s in zip(_WEIGHTS, axis_sums)}
 
-    avg_scores = {}
-    for axis in _WEIGHTS:
-        vals = [e["scores"][axis] for e in all_evals]
-        avg_scores[axis] = round(sum(vals) / len(vals), 1)
+    def _group_avg(codes: np.ndarray, ids: Dict[Any, int]) -> Dict[Any, float]:
+        sums = np.bincount(codes, weights=total_x10, minlength=len(ids))
+        counts = np.bincount(codes, minlength=len(ids))
+        return {k: round(float(sums[c]) / (10 * int(counts[c])), 1) for k, c in ids.items()}
 
-    phase_avg = {k: round(sum(v) / len(v), 1) for k, v in by_phase.items()}
-    intent_avg = {k: round(sum(v) / len(v), 1) for k, v in by_intent.items()}
+    phase_avg = _group_avg(phase_codes, phase_ids)
+    intent_avg = _group_avg(intent_codes, intent_ids)
 
     return {
         "total_records": len(records),
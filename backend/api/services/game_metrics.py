@@ -7,6 +7,8 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
+import numpy as np
+
 
 # ---------------------------------------------------------------------------
 # Skill Score
@@ -145,19 +147,19 @@ def calculate_tension_timeline(
     if not eval_history or len(eval_history) < 2:
         return {"timeline": [], "avg": 0.0, "label": "穏やかな展開"}
 
-    # 各手の |delta_cp|
-    abs_deltas = [abs(eval_history[i] - eval_history[i - 1]) for i in range(1, len(eval_history))]
+    # 各手の |delta_cp| (numpy でまとめて計算)
+    evals = np.asarray(eval_history, dtype=np.int64)
+    abs_deltas = np.abs(np.diff(evals))
 
-    # 移動平均 (window=5)
-    n = len(abs_deltas)
-    smoothed: List[float] = []
-    for i in range(n):
-        start = max(0, i - _WINDOW + 1)
-        window = abs_deltas[start : i + 1]
-        smoothed.append(sum(window) / len(window))
+    # 移動平均 (window=5): 累積和の差で各窓の合計を求める
+    n = abs_deltas.size
+    csum = np.concatenate(([0], np.cumsum(abs_deltas)))
+    idx = np.arange(n)
+    start = np.maximum(0, idx - _WINDOW + 1)
+    smoothed = (csum[idx + 1] - csum[start]) / (idx + 1 - start)
 
     # tension = clamp(smoothed / _SCALE, 0, 1)
-    timeline = [min(1.0, max(0.0, v / _SCALE)) for v in smoothed]
+    timeline = np.clip(smoothed / _SCALE, 0.0, 1.0).tolist()
 
     avg_tension = sum(timeline) / len(timeline) if timeline else 0.0
     avg_tension = round(avg_tension, 3)
@@ -347,9 +347,25 @@ def extract_position_features(
         move_intent, tension_delta を含む辞書
     """
     pos = parse_position_cmd(sfen)
-    board = pos.board
-    turn = pos.turn
+    return extract_position_features_from_board(
+        pos.board, pos.turn,
+        move=move, ply=ply, eval_info=eval_info, prev_features=prev_features,
+    )
 
+
+def extract_position_features_from_board(
+    board: List[List[Optional[str]]],
+    turn: str,
+    move: Optional[str] = None,
+    ply: int = 0,
+    eval_info: Optional[Dict[str, Any]] = None,
+    prev_features: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """解析済みの盤面から特徴量を抽出する (extract_position_features の盤面版).
+
+    手順を1手ずつ進めながら複数局面を調べる場合に、position コマンドの
+    再パースを避けるために使う。board は変更しない。turn は 'b' / 'w'。
+    """
     # 手番側の特徴を計算
     ks = _king_safety(board, turn)
     pa = _piece_activity(board, turn)
@@ -5,8 +5,28 @@ Gemini APIの代替として、学習データのベースライン品質を確
 """
 from __future__ import annotations
 
-import random
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+
+# ---------------------------------------------------------------------------
+# テンプレート選択用の軽量PRNG (SplitMix64)
+# ---------------------------------------------------------------------------
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+# seed 未指定時に共有する内部状態（単一要素リストで更新する）
+_rng_state: List[int] = [_GOLDEN_GAMMA]
+
+
+def _pick(n: int, state: List[int] = _rng_state) -> int:
+    """SplitMix64 で [0, n) のインデックスを1つ選ぶ.
+
+    セキュリティ用途ではないため、random モジュールの MT 状態やロックを使わない。
+    """
+    s = (state[0] + _GOLDEN_GAMMA) & _MASK64
+    state[0] = s
+    z = ((s ^ (s >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return (z ^ (z >> 31)) % n
 
 # ---------------------------------------------------------------------------
 # フェーズ別テンプレート
@@ -121,7 +141,7 @@ def generate_template_commentary(
     str
         日本語の解説テキスト（50-200文字程度）
     """
-    rng = random.Random(seed)
+    state = _rng_state if seed is None else [seed & _MASK64]
 
     phase = features.get("phase", "midgame")
     intent = features.get("move_intent")
@@ -137,11 +157,11 @@ def generate_template_commentary(
     else:
         templates = _MIDGAME_TEMPLATES
 
-    template = rng.choice(templates)
+    template = templates[_pick(len(templates), state)]
 
     # 意図記述
     intent_options = _INTENT_DESCRIPTIONS.get(intent, _INTENT_DESCRIPTIONS[None])
-    intent_desc = rng.choice(intent_options)
+    intent_desc = intent_options[_pick(len(intent_options), state)]
 
     # 数値記述
     safety_desc = _describe_safety_text(king_safety)
@@ -0,0 +1,51 @@
+"""
+backend/api/utils/fast_json.py
+------------------------------
+JSON シリアライズの薄いラッパ。
+
+orjson がインストールされていればそれを使い、なければ標準 json にフォールバックする。
+dumps は常に UTF-8 の bytes を返すので、StreamingResponse / ASGI send にそのまま渡せる。
+FastJSONResponse は同じ経路でボディを作る JSONResponse。
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Union
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    orjson = None
+    HAS_ORJSON = False
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    """obj を JSON の bytes に変換する。sort_keys=True でキー順を固定する (ハッシュ用)。"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else None)
+    return json.dumps(
+        obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys,
+    ).encode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """JSON の bytes / str をパースする。"""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """dumps でボディを生成する JSONResponse (orjson 時は numpy 配列もそのまま出力可)。"""
+
+    def render(self, content: Any) -> bytes:
+        if HAS_ORJSON:
+            return orjson.dumps(
+                content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+            )
+        return dumps(content)
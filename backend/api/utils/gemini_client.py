@@ -15,6 +15,7 @@ from __future__ import annotations
 
 import logging
 import os
+from functools import lru_cache
 from typing import Optional
 
 try:
@@ -46,6 +47,8 @@ def ensure_configured() -> Optional[str]:
         return None
     if _CONFIGURED_FOR_KEY != key:
         genai.configure(api_key=key)
+        # 旧キーのクライアントを掴んだモデルを使い回さない
+        get_generative_model.cache_clear()
         _CONFIGURED_FOR_KEY = key
         _LOG.info("[gemini_client] configured (key suffix=...%s)", key[-4:])
     return key
@@ -62,3 +65,26 @@ def get_model_name(default: str = "gemini-2.0-flash") -> str:
     """
     raw = (os.getenv("GEMINI_EXPLAIN_MODEL") or os.getenv("GEMINI_MODEL") or "").strip()
     return raw or default
+
+
+@lru_cache(maxsize=16)
+def get_generative_model(
+    model_name: str,
+    max_output_tokens: Optional[int] = None,
+    response_mime_type: Optional[str] = None,
+) -> "genai.GenerativeModel":
+    """
+    モデル名と生成設定ごとに GenerativeModel を1つだけ作って共有する。
+
+    リクエストごとに設定の検証・コピーを繰り返さないためのキャッシュ。
+    APIキーが変わったときは ensure_configured がキャッシュを破棄する。
+    """
+    if max_output_tokens is None and response_mime_type is None:
+        return genai.GenerativeModel(model_name)
+    return genai.GenerativeModel(
+        model_name,
+        generation_config=genai.types.GenerationConfig(
+            max_output_tokens=max_output_tokens,
+            response_mime_type=response_mime_type,
+        ),
+    )
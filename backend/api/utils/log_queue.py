@@ -0,0 +1,67 @@
+"""
+backend/api/utils/log_queue.py
+------------------------------
+ログ出力をイベントループから切り離す。
+
+指定ロガーのハンドラを QueueListener (別スレッド) に移し、ロガーには
+QueueHandler だけを残す。リクエスト処理中の _LOG.info はキューへの put だけになり、
+stderr への書き込みでイベントループが止まらない。
+
+uvicorn.access は AccessFormatter が record.args を参照するため対象外
+(QueueHandler.prepare が args を消してしまう)。
+"""
+from __future__ import annotations
+
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+
+# uvicorn.error は "uvicorn" に伝播し、そこでハンドラが付いている
+_DEFAULT_LOGGERS = ("uvicorn",)
+
+
+class QueueLogging:
+    """start() でハンドラをキュー経由に付け替え、stop() で元に戻す。"""
+
+    def __init__(self, logger_names: Tuple[str, ...] = _DEFAULT_LOGGERS):
+        self._logger_names = logger_names
+        self._listener: Optional[QueueListener] = None
+        self._saved: Dict[str, Tuple[List[logging.Handler], QueueHandler]] = {}
+
+    def start(self) -> None:
+        if self._listener is not None:
+            return
+        q: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+        targets: List[logging.Handler] = []
+        for name in self._logger_names:
+            logger = logging.getLogger(name)
+            handlers = list(logger.handlers)
+            if not handlers:
+                continue
+            qh = QueueHandler(q)
+            for h in handlers:
+                logger.removeHandler(h)
+            logger.addHandler(qh)
+            self._saved[name] = (handlers, qh)
+            targets.extend(handlers)
+        if not targets:
+            return
+        self._listener = QueueListener(q, *targets, respect_handler_level=True)
+        self._listener.start()
+
+    def stop(self) -> None:
+        if self._listener is None:
+            return
+        # 残りのレコードを吐き出してから元のハンドラに戻す
+        self._listener.stop()
+        self._listener = None
+        for name, (handlers, qh) in self._saved.items():
+            logger = logging.getLogger(name)
+            logger.removeHandler(qh)
+            for h in handlers:
+                logger.addHandler(h)
+        self._saved.clear()
+
+
+queue_logging = QueueLogging()
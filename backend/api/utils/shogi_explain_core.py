@@ -8,8 +8,7 @@ import json
 import os
 import re
 
-import google.generativeai as genai
-from backend.api.utils.gemini_client import ensure_configured, get_model_name
+from backend.api.utils.gemini_client import ensure_configured, get_generative_model, get_model_name
 
 _LEVEL_ORDER = {"beginner": 0, "intermediate": 1, "advanced": 2}
 
@@ -826,7 +825,7 @@ async def rewrite_with_gemini(base_text: str, facts: Dict[str, Any]) -> Optional
 """
     try:
         model_name = get_model_name()
-        model = genai.GenerativeModel(model_name)
+        model = get_generative_model(model_name)
         res = await model.generate_content_async(prompt)
         return (getattr(res, "text", None) or "").strip() or None
     except Exception:
@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 
 KANJI_NUM = {1: "一", 2: "二", 3: "三", 4: "四", 5: "五", 6: "六", 7: "七", 8: "八", 9: "九"}
 PIECE_MAP = {
@@ -27,10 +28,12 @@ class ShogiUtils:
         return o if 1 <= o <= 9 else 0
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def format_move_label(move: str, turn: str) -> str:
         """
         USI符号（例: 7g7f, P*2c）を日本語表記（例: ▲7六歩）に変換する。
         盤面情報がないため駒名は省略する場合がある。
+        (move, turn) だけで決まる純関数なので結果をキャッシュする。
         """
         if not move:
             return ""
@@ -3,4 +3,6 @@ set -eu
 cd /app/backend
 
 # Simple entrypoint: run uvicorn on 0.0.0.0:8787
-exec uvicorn backend.api.main:app --host 0.0.0.0 --port 8787
+# uvloop / httptools come with uvicorn[standard]; pin them so a missing wheel
+# fails at startup instead of silently falling back to asyncio / h11.
+exec uvicorn backend.api.main:app --host 0.0.0.0 --port 8787 --loop uvloop --http httptools
@@ -0,0 +1,14 @@
+"""pytest 共通設定."""
+from __future__ import annotations
+
+from unittest import mock
+
+import pytest
+
+
+@pytest.fixture(autouse=True, scope="session")
+def _isolate_training_logs(tmp_path_factory):
+    """解説生成を通るテストが実データの data/training_logs に追記しないようにする."""
+    log_dir = str(tmp_path_factory.mktemp("training_logs"))
+    with mock.patch("backend.api.services.training_logger._LOG_DIR", log_dir):
+        yield log_dir
@@ -0,0 +1,99 @@
+"""Tests for the in-memory LLM result caches in ai_service."""
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+from backend.api.services.ai_service import _TTLCache, _digest_cache_key, _digest_cache_key_for, _single_flight
+
+
+class TestTTLCache:
+    def test_get_set(self):
+        c = _TTLCache(maxsize=2, ttl_sec=60)
+        c.set("a", 1)
+        assert c.get("a") == 1
+        assert c.get("missing") is None
+
+    def test_overflow_evicts_least_recently_used(self):
+        c = _TTLCache(maxsize=2, ttl_sec=60)
+        c.set("a", 1)
+        c.set("b", 2)
+        c.get("a")          # a を最近使用にする
+        c.set("c", 3)       # b が追い出される
+        assert c.get("a") == 1
+        assert c.get("b") is None
+        assert c.get("c") == 3
+        assert len(c) == 2
+
+    def test_expired_entry_is_dropped(self):
+        c = _TTLCache(maxsize=2, ttl_sec=10)
+        with patch("backend.api.services.ai_service.time.monotonic", return_value=1000.0):
+            c.set("a", 1)
+        with patch("backend.api.services.ai_service.time.monotonic", return_value=1011.0):
+            assert c.get("a") is None
+        assert len(c) == 0
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_execution(self):
+        calls = []
+        inflight = {}
+
+        async def produce():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        async def scenario():
+            return await asyncio.gather(
+                *(_single_flight(inflight, "k", produce) for _ in range(5))
+            )
+
+        assert asyncio.run(scenario()) == ["result"] * 5
+        assert len(calls) == 1
+        assert inflight == {}
+
+    def test_error_is_shared_and_key_released(self):
+        inflight = {}
+
+        async def produce():
+            await asyncio.sleep(0)
+            raise ValueError("boom")
+
+        async def scenario():
+            return await asyncio.gather(
+                _single_flight(inflight, "k", produce),
+                _single_flight(inflight, "k", produce),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(r, ValueError) for r in results)
+        assert inflight == {}
+
+
+class TestDigestCacheKey:
+    def test_eval_noise_within_quantum_shares_key(self):
+        assert _digest_cache_key(4, [0, 10, 30, 60], "b") == _digest_cache_key(4, [5, 20, 40, 70], "b")
+
+    def test_eval_change_changes_key(self):
+        assert _digest_cache_key(4, [0, 10, 30, 60], "b") != _digest_cache_key(4, [0, 10, 30, 300], "b")
+
+    def test_long_history_is_downsampled(self):
+        base = list(range(0, 4000, 100))  # 40 手 -> 2 手おきに間引かれる
+        noisy = list(base)
+        noisy[1] += 500                   # 間引かれる位置の変化はキーに影響しない
+        assert _digest_cache_key(40, base, "b") == _digest_cache_key(40, noisy, "b")
+
+    def test_different_notable_moves_change_key(self):
+        base = {"total_moves": 4, "eval_history": [0, 10, 30, 60], "winner": "b"}
+        a = dict(base, notes=[{"ply": 3, "move": "7g7f", "delta_cp": -300}])
+        b = dict(base, notes=[{"ply": 3, "move": "2g2f", "delta_cp": -300}])
+        assert _digest_cache_key_for(a) != _digest_cache_key_for(b)
+
+    def test_different_moves_change_key(self):
+        base = {"total_moves": 2, "eval_history": [0, 10], "winner": "b"}
+        a = dict(base, moves=["7g7f", "3c3d"])
+        b = dict(base, moves=["2g2f", "8c8d"])
+        assert _digest_cache_key_for(a) != _digest_cache_key_for(b)
+        assert _digest_cache_key_for(a) == _digest_cache_key_for(dict(a))
@@ -8,6 +8,7 @@ from backend.api.services.ai_service import (
     build_digest_features_block,
     _describe_safety,
     _describe_pressure,
+    _build_digest_prompt,
 )
 
 
@@ -188,3 +189,39 @@ class TestBuildDigestFeaturesBlock:
         assert "80/100" in block
         # 終盤の平均 attack_pressure = 80
         assert "強い攻撃態勢" in block
+
+
+class TestBuildDigestPrompt:
+    def test_matches_baseline_prompt(self):
+        """行頭に余計なインデントが入らず、従来と同じ文面になること。"""
+        prompt = _build_digest_prompt(
+            [0, 50, -30, 120, 400],
+            5,
+            [{"ply": 3, "move": "7g7f", "delta_cp": -200}, {"ply": 4, "move": "3c3d", "delta_cp": 40}],
+            {"sente": {"attack": ["四間飛車"], "defense": ["美濃囲い"]}},
+            "先手",
+            "後手",
+            "b",
+            [],
+        )
+        expected = """以下の3点を含む200文字以内の文章を出力せよ。
+1. 先手と後手の戦型
+2. 最大の転換点（何手目の何の手）
+3. 勝者と勝因
+
+先手（先手）vs 後手（後手）、5手
+評価値推移: 0手:0, 1手:50, 2手:-30, 3手:120, 4手:400
+
+【戦型・囲い情報】
+- 先手（先手）: 戦型=四間飛車, 囲い=美濃囲い, 手筋=なし
+- 後手（後手）: 戦型=不明, 囲い=不明, 手筋=なし
+
+【注目手（評価値変動が大きかった手）】
+  - 3手目 ▲7六(77) (Δ-200cp / 悪手)
+  - 4手目 △3四(33) (Δ+40cp / 普通)
+
+例: 石田流 vs 棒金の一局。42手目△7三(82)が悪手となり形勢逆転。先手が中盤以降の優勢を維持し73手で勝利した。
+
+見出し・箇条書き・挨拶文・装飾すべて禁止。地の文のみ。
+【厳守】200文字以内。文章を途中で切らず最後まで完結させること。"""
+        assert prompt == expected
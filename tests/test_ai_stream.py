@@ -0,0 +1,95 @@
+"""Tests for the streamed Gemini text helper in ai_service."""
+from __future__ import annotations
+
+import asyncio
+
+from backend.api.services.ai_service import _generate_text_streamed
+
+
+class _Chunk:
+    def __init__(self, text):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("no parts")
+        return self._text
+
+
+class _Inner:
+    """SDK の res._iterator (gRPC ストリーム) 相当。"""
+
+    def __init__(self, texts):
+        self._texts = iter(texts)
+        self.consumed = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            t = next(self._texts)
+        except StopIteration:
+            raise StopAsyncIteration
+        self.consumed += 1
+        return t
+
+    async def aclose(self):
+        self.closed = True
+
+
+class _CancelOnlyInner(_Inner):
+    aclose = None
+
+    def cancel(self):
+        self.closed = True
+
+
+class _Response:
+    def __init__(self, texts, inner_cls=_Inner):
+        self._iterator = inner_cls(texts)
+
+    @property
+    def consumed(self):
+        return self._iterator.consumed
+
+    async def __aiter__(self):
+        async for t in self._iterator:
+            yield _Chunk(t)
+
+
+class _Model:
+    def __init__(self, texts, inner_cls=_Inner):
+        self.response = _Response(texts, inner_cls)
+        self.kwargs = None
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.kwargs = kwargs
+        return self.response
+
+
+def test_returns_full_text_under_limit():
+    model = _Model(["序盤は", None, "互角です。"])
+    text, res = asyncio.run(_generate_text_streamed(model, "p", limit=80))
+    assert text == "序盤は互角です。"
+    assert res is model.response
+    assert model.kwargs == {"stream": True}
+
+
+def test_stops_reading_after_limit_and_trims_to_sentence():
+    model = _Model(["あ" * 10 + "。", "い" * 30, "う" * 30, "え" * 30])
+    text, _ = asyncio.run(_generate_text_streamed(model, "p", limit=30))
+    assert text == "あ" * 10 + "。"
+    assert model.response.consumed == 3  # 上限 + 余裕 (50 文字) に達した時点で止まる
+    assert model.response._iterator.closed
+
+
+def test_cancels_grpc_style_inner_stream_on_early_stop():
+    model = _Model(["い" * 60, "う" * 30], inner_cls=_CancelOnlyInner)
+    asyncio.run(_generate_text_streamed(model, "p", limit=30))
+    assert model.response.consumed == 1
+    assert model.response._iterator.closed
@@ -0,0 +1,45 @@
+"""Tests for the supabase principal cache in backend.api.auth."""
+from __future__ import annotations
+
+import time
+import unittest
+from unittest.mock import patch
+
+from backend.api import auth
+
+
+class TestPrincipalCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        auth._PRINCIPAL_CACHE.clear()
+        self.addCleanup(auth._PRINCIPAL_CACHE.clear)
+        patcher = patch.object(auth, "is_pro_user", return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_claims_without_exp_are_not_cached(self) -> None:
+        with patch.object(auth, "_get_supabase_claims", return_value={"sub": "u1"}) as claims:
+            auth._get_supabase_principal("tok")
+            auth._get_supabase_principal("tok")
+        self.assertEqual(claims.call_count, 2)
+        self.assertEqual(len(auth._PRINCIPAL_CACHE), 0)
+
+    def test_overflow_evicts_least_recently_used(self) -> None:
+        def claims_for(token):
+            return {"sub": token, "exp": time.time() + 3600}
+
+        with patch.object(auth, "_PRINCIPAL_CACHE_MAX", 2), \
+                patch.object(auth, "_get_supabase_claims", side_effect=claims_for) as claims:
+            auth._get_supabase_principal("a")
+            auth._get_supabase_principal("b")
+            auth._get_supabase_principal("a")  # hit: a becomes most recently used
+            auth._get_supabase_principal("c")  # evicts b only
+            self.assertEqual(claims.call_count, 3)
+            auth._get_supabase_principal("a")
+            self.assertEqual(claims.call_count, 3)
+            auth._get_supabase_principal("b")
+            self.assertEqual(claims.call_count, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""tests for the /api/explain/digest worker pool."""
+from __future__ import annotations
+
+import asyncio
+import unittest
+
+from backend.api.services.digest_workers import DigestWorkerPool
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class TestDigestWorkerPool(unittest.TestCase):
+
+    def test_not_running_without_loop(self) -> None:
+        self.assertFalse(DigestWorkerPool(2).running)
+
+    def test_limits_concurrency_and_propagates_errors(self) -> None:
+        state = {"active": 0, "peak": 0}
+
+        async def job(i: int) -> int:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            await asyncio.sleep(0.01)
+            state["active"] -= 1
+            if i == 3:
+                raise ValueError(i)
+            return i
+
+        async def scenario():
+            pool = DigestWorkerPool(num_workers=2)
+            task = asyncio.create_task(pool.run())
+            await asyncio.sleep(0)
+            self.assertTrue(pool.running)
+            results = await asyncio.gather(
+                *(pool.submit(lambda i=i: job(i)) for i in range(6)),
+                return_exceptions=True,
+            )
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertFalse(pool.running)
+            return results
+
+        results = _run(scenario())
+        self.assertEqual(results[:3], [0, 1, 2])
+        self.assertIsInstance(results[3], ValueError)
+        self.assertEqual(results[4:], [4, 5])
+        self.assertEqual(state["peak"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
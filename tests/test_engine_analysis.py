@@ -22,7 +22,7 @@ from backend.api.services.engine_analysis import (
 # Unit tests for _parse_info_line (no engine needed)
 # =====================================================================
 class TestParseInfoLine(unittest.TestCase):
-    """parse_usi_info と同等のパーサの単体テスト."""
+    """engine_state.parse_usi_info (engine_analysis からも共用) の単体テスト."""
 
     def test_cp_score(self):
         line = "info depth 10 multipv 1 score cp 120 nodes 50000 pv 7g7f 3c3d"
@@ -59,6 +59,17 @@ class TestParseInfoLine(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertEqual(result["score"]["cp"], 70)  # 100 * 0.7
 
+    def test_bound_after_value(self):
+        line = "info depth 10 score cp 100 upperbound nodes 5 pv 7g7f 8c8d"
+        result = _parse_info_line(line)
+        self.assertIsNotNone(result)
+        self.assertEqual(result["score"]["cp"], 70)
+        self.assertEqual(result["pv"], "7g7f 8c8d")
+
+    def test_mate_without_distance(self):
+        line = "info depth 10 score mate + pv 1a1b"
+        self.assertIsNone(_parse_info_line(line))
+
     def test_no_score(self):
         line = "info depth 10 nodes 50000"
         result = _parse_info_line(line)
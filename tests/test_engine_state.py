@@ -0,0 +1,281 @@
+"""engine_state (stdout 行読み出し・バッチ解析プール) のテスト。"""
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from backend.api.engine_state import (
+    _PIPE_SIZE,
+    BaseEngine,
+    BatchEnginePool,
+    BatchEngineState,
+    is_gote_turn,
+)
+
+
+def _engine_with_stdout(*chunks: bytes, eof: bool = False):
+    reader = asyncio.StreamReader()
+    for chunk in chunks:
+        reader.feed_data(chunk)
+    if eof:
+        reader.feed_eof()
+    eng = BaseEngine(name="Test")
+    eng.proc = SimpleNamespace(returncode=None)
+    eng._stdout = reader
+    return eng, reader
+
+
+class TestReadAvailable(unittest.TestCase):
+
+    def test_returns_all_buffered_lines_and_keeps_tail(self) -> None:
+        async def scenario():
+            eng, reader = _engine_with_stdout(b"info a\ninfo b\r\ninfo ", b"c")
+            first = await eng._read_available(timeout=0.1)
+            reader.feed_data(b"\nbestmove 7g7f\n")
+            second = await eng._read_available(timeout=0.1)
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual(first, ["info a", "info b"])
+        self.assertEqual(second, ["info c", "bestmove 7g7f"])
+
+    def test_timeout_returns_none(self) -> None:
+        async def scenario():
+            eng, _ = _engine_with_stdout(b"partial")
+            return await eng._read_available(timeout=0.05)
+
+        self.assertIsNone(asyncio.run(scenario()))
+
+    def test_read_line_shares_buffer_with_unread(self) -> None:
+        async def scenario():
+            eng, _ = _engine_with_stdout(b"bestmove 7g7f\nreadyok\nlast", eof=True)
+            lines = await eng._read_available(timeout=0.1)
+            eng._unread(lines[1:])
+            return [await eng._read_line(timeout=0.1) for _ in range(3)]
+
+        self.assertEqual(asyncio.run(scenario()), ["readyok", "last", None])
+
+
+_PIPE_PROBE = """#!{python}
+import fcntl, sys
+print(fcntl.fcntl(1, fcntl.F_GETPIPE_SZ), fcntl.fcntl(2, fcntl.F_GETPIPE_SZ), flush=True)
+for line in sys.stdin:
+    print("echo", line.strip(), flush=True)
+"""
+
+
+@unittest.skipUnless(hasattr(fcntl, "F_GETPIPE_SZ"), "F_SETPIPE_SZ is Linux-only")
+class TestSpawn(unittest.TestCase):
+
+    def test_child_gets_enlarged_pipes(self) -> None:
+        with tempfile.TemporaryDirectory() as d:
+            script = os.path.join(d, "probe.py")
+            with open(script, "w") as f:
+                f.write(_PIPE_PROBE.format(python=sys.executable))
+            os.chmod(script, 0o755)
+
+            async def scenario():
+                eng = BaseEngine(name="Test")
+                await eng._spawn()
+                try:
+                    await eng._send_lines(["usi"])
+                    return [await eng._read_line(timeout=5.0) for _ in range(2)]
+                finally:
+                    eng.proc.stdin.close()
+                    await eng.proc.wait()
+                    eng._close_pipes()
+
+            with patch("backend.api.engine_state.USI_CMD", script), \
+                    patch("backend.api.engine_state.ENGINE_WORK_DIR", d):
+                lines = asyncio.run(scenario())
+        self.assertEqual(lines, [f"{_PIPE_SIZE} {_PIPE_SIZE}", "echo usi"])
+
+
+class TestIsGoteTurn(unittest.TestCase):
+
+    def test_startpos_moves_parity(self) -> None:
+        self.assertFalse(is_gote_turn("position startpos"))
+        self.assertFalse(is_gote_turn("position startpos moves "))
+        self.assertTrue(is_gote_turn("position startpos moves 7g7f"))
+        self.assertFalse(is_gote_turn("position startpos moves 7g7f 3c3d"))
+        self.assertTrue(is_gote_turn("position startpos moves  7g7f\t3c3d 2g2f"))
+
+    def test_sfen_turn(self) -> None:
+        board = "lnsgkgsnl/1r5b1/ppppppppp/9/9/9/PPPPPPPPP/1B5R1/LNSGKGSNL"
+        self.assertFalse(is_gote_turn(f"position sfen {board} b - 1"))
+        self.assertTrue(is_gote_turn(f"position sfen {board} w - 1"))
+        self.assertTrue(is_gote_turn(f"sfen {board} w"))
+        self.assertTrue(is_gote_turn(f"position  sfen {board}  w - 1"))
+        self.assertFalse(is_gote_turn("position sfen"))
+
+
+async def _fake_ensure_alive(self) -> None:
+    self.proc = SimpleNamespace(returncode=None)
+
+
+async def _fake_stop_and_flush(self) -> None:
+    pass
+
+
+async def _fake_fast_analyze_one(self, position_cmd: str):
+    """ply 数に応じて待ち時間を変え、完了順を ply 順とずらす。"""
+    ply = len(position_cmd.split()) - 3 if "moves" in position_cmd else 0
+    await asyncio.sleep(0.01 * (ply % 3))
+    return {
+        "ok": True,
+        "bestmove": "7g7f",
+        "multipv": [{"multipv": 1, "score": {"type": "cp", "cp": 100 + ply}, "pv": "7g7f"}],
+    }
+
+
+class TestBatchEnginePool(unittest.TestCase):
+
+    def test_results_are_streamed_in_ply_order(self) -> None:
+        async def scenario():
+            pool = BatchEnginePool(BatchEngineState(), size=3)
+            rows = [json.loads(line) async for line in pool.stream_batch_analyze(["7g7f"] * 6)]
+            return pool, rows
+
+        with patch.object(BatchEngineState, "ensure_alive", _fake_ensure_alive), \
+                patch.object(BatchEngineState, "stop_and_flush", _fake_stop_and_flush), \
+                patch.object(BatchEngineState, "fast_analyze_one", _fake_fast_analyze_one):
+            pool, rows = asyncio.run(scenario())
+        # 追加エンジンは _engines() 経由で起動される
+        self.assertEqual([e.name for e in pool._helpers], ["BatchEngine-1", "BatchEngine-2"])
+        self.assertEqual(rows[0], {"status": "start"})
+        self.assertEqual([r["ply"] for r in rows[1:]], list(range(7)))
+        # 後手番 (奇数 ply) は先手視点に反転される
+        self.assertEqual(rows[2]["result"]["multipv"][0]["score"]["cp"], -101)
+        self.assertEqual(rows[3]["result"]["multipv"][0]["score"]["cp"], 102)
+
+    def test_workers_get_prefix_position_commands(self) -> None:
+        seen = []
+
+        async def recording_analyze_one(self, position_cmd):
+            seen.append(position_cmd)
+            return await _fake_fast_analyze_one(self, position_cmd)
+
+        async def scenario():
+            pool = BatchEnginePool(BatchEngineState(), size=2)
+            return [line async for line in pool.stream_batch_analyze(["7g7f", "3c3d", "2g2f"])]
+
+        with patch.object(BatchEngineState, "ensure_alive", _fake_ensure_alive), \
+                patch.object(BatchEngineState, "stop_and_flush", _fake_stop_and_flush), \
+                patch.object(BatchEngineState, "fast_analyze_one", recording_analyze_one):
+            asyncio.run(scenario())
+        self.assertEqual(sorted(seen), sorted([
+            "position startpos",
+            "position startpos moves 7g7f",
+            "position startpos moves 7g7f 3c3d",
+            "position startpos moves 7g7f 3c3d 2g2f",
+        ]))
+
+    def test_close_shuts_down_helpers_only(self) -> None:
+        stopped = []
+
+        async def fake_shutdown(self, timeout: float = 2.0) -> None:
+            stopped.append(self.name)
+
+        async def scenario():
+            pool = BatchEnginePool(BatchEngineState(), size=3)
+            pool._engines(3)
+            await pool.close()
+            return pool
+
+        with patch.object(BatchEngineState, "shutdown", fake_shutdown):
+            pool = asyncio.run(scenario())
+        self.assertEqual(stopped, ["BatchEngine-1", "BatchEngine-2"])
+        self.assertEqual(pool._helpers, [])
+
+class TestAnalyzeMany(unittest.TestCase):
+
+    def test_lock_is_released_between_chunks(self) -> None:
+        flushes = []
+
+        async def counting_flush(self) -> None:
+            flushes.append(1)
+
+        async def scenario():
+            eng = BatchEngineState()
+            return await eng.analyze_many([f"position startpos moves {'7g7f ' * i}".strip() for i in range(20)])
+
+        with patch.object(BatchEngineState, "ensure_alive", _fake_ensure_alive), \
+                patch.object(BatchEngineState, "stop_and_flush", counting_flush), \
+                patch.object(BatchEngineState, "fast_analyze_one", _fake_fast_analyze_one), \
+                patch("backend.api.engine_state._ANALYZE_MANY_CHUNK", 8):
+            results = asyncio.run(scenario())
+        self.assertEqual(len(results), 20)
+        self.assertEqual(len(flushes), 3)  # 8 + 8 + 4
+
+    def test_adapter_timeout_cancels_the_engine_coroutine(self) -> None:
+        from backend.api import engine_state
+        from backend.api.routers import annotate
+
+        state = {"cancelled": False}
+
+        async def hanging_analyze_many(position_cmds):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            with patch.object(engine_state, "_MAIN_LOOP", loop), \
+                    patch.object(engine_state.batch_engine, "analyze_many", hanging_analyze_many), \
+                    patch.object(annotate, "_ANALYZE_PER_PLY_TIMEOUT_SEC", 0.05):
+                out = annotate._EngineAdapter().analyze_many([{"usi": "startpos moves 7g7f", "ply": 1}])
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop).result(timeout=1.0)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=1.0)
+            loop.close()
+        self.assertEqual([r.bestmove for r in out], [""])
+        self.assertTrue(state["cancelled"])
+
+    def test_adapter_keeps_plies_analyzed_before_a_timeout(self) -> None:
+        from backend.api import engine_state
+        from backend.api.routers import annotate
+
+        calls = []
+
+        async def second_chunk_hangs(position_cmds):
+            calls.append(len(position_cmds))
+            if len(calls) > 1:
+                await asyncio.sleep(10)
+            return [{"ok": True, "bestmove": "7g7f", "multipv": []} for _ in position_cmds]
+
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            with patch.object(engine_state, "_MAIN_LOOP", loop), \
+                    patch.object(engine_state, "_ANALYZE_MANY_CHUNK", 2), \
+                    patch.object(engine_state.batch_engine, "analyze_many", second_chunk_hangs), \
+                    patch.object(annotate, "_ANALYZE_PER_PLY_TIMEOUT_SEC", 0.05):
+                out = annotate._EngineAdapter().analyze_many(
+                    [{"usi": "startpos", "ply": i} for i in range(5)]
+                )
+            asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop).result(timeout=1.0)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=1.0)
+            loop.close()
+        # 2手目までは残り、タイムアウトしたチャンク以降だけ空で埋める
+        self.assertEqual(calls, [2, 2])
+        self.assertEqual([r.bestmove for r in out], ["7g7f", "7g7f", "", "", ""])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""tests for dynamic batching of /api/explain LLM calls."""
+from __future__ import annotations
+
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from backend.api.services.ai_service import _parse_batch_texts
+from backend.api.services.explain_batcher import ExplainBatcher
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class TestExplainBatcher(unittest.TestCase):
+
+    def test_not_running_without_loop(self) -> None:
+        self.assertFalse(ExplainBatcher(4, 0.01).running)
+
+    def test_merges_concurrent_requests(self) -> None:
+        sizes = []
+
+        async def fake_batch(requests):
+            sizes.append(len(requests))
+            return [f"c{r['ply']}" for r in requests]
+
+        async def scenario():
+            b = ExplainBatcher(max_batch_size=4, max_delay=0.05)
+            task = asyncio.create_task(b.run())
+            await asyncio.sleep(0)
+            self.assertTrue(b.running)
+            with patch(
+                "backend.api.services.explain_batcher.AIService.generate_position_comment_batch",
+                side_effect=fake_batch,
+            ):
+                results = await asyncio.gather(*(b.submit(ply=i) for i in range(6)))
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertFalse(b.running)
+            return results
+
+        results = _run(scenario())
+        self.assertEqual(results, [f"c{i}" for i in range(6)])
+        self.assertEqual(sizes, [4, 2])
+
+    def test_per_item_exception_is_propagated(self) -> None:
+        async def fake_batch(requests):
+            return [ValueError("boom") if r["ply"] == 1 else "ok" for r in requests]
+
+        async def scenario():
+            b = ExplainBatcher(max_batch_size=2, max_delay=0.05)
+            task = asyncio.create_task(b.run())
+            await asyncio.sleep(0)
+            with patch(
+                "backend.api.services.explain_batcher.AIService.generate_position_comment_batch",
+                side_effect=fake_batch,
+            ):
+                results = await asyncio.gather(
+                    b.submit(ply=0), b.submit(ply=1), return_exceptions=True,
+                )
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return results
+
+        ok, err = _run(scenario())
+        self.assertEqual(ok, "ok")
+        self.assertIsInstance(err, ValueError)
+
+    def test_stop_releases_in_flight_dispatch(self) -> None:
+        started = asyncio.Event()
+
+        async def slow_batch(requests):
+            started.set()
+            await asyncio.sleep(10)
+
+        async def scenario():
+            b = ExplainBatcher(max_batch_size=1, max_delay=0.0)
+            task = asyncio.create_task(b.run())
+            await asyncio.sleep(0)
+            with patch(
+                "backend.api.services.explain_batcher.AIService.generate_position_comment_batch",
+                side_effect=slow_batch,
+            ):
+                pending = asyncio.create_task(b.submit(ply=0))
+                await started.wait()
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+                return await asyncio.wait_for(asyncio.gather(pending, return_exceptions=True), 1.0)
+
+        (result,) = _run(scenario())
+        self.assertIsInstance(result, RuntimeError)
+
+
+class TestParseBatchTexts(unittest.TestCase):
+
+    def test_valid_array(self) -> None:
+        self.assertEqual(_parse_batch_texts('["a", "b"]', 2), ["a", "b"])
+
+    def test_count_mismatch(self) -> None:
+        self.assertIsNone(_parse_batch_texts('["a"]', 2))
+
+    def test_not_json(self) -> None:
+        self.assertIsNone(_parse_batch_texts("解説です。", 1))
+
+    def test_empty_element(self) -> None:
+        self.assertIsNone(_parse_batch_texts('["a", ""]', 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,7 +4,7 @@ from __future__ import annotations
 import unittest
 from unittest.mock import AsyncMock, patch, MagicMock
 
-from backend.api.routers.explain import PositionCommentRequest
+from backend.api.routers.explain import PositionCommentRequest, _extract_digest_features
 from backend.api.services.ml_trainer import STYLES, rule_based_predict
 
 
@@ -142,5 +142,19 @@ class TestEndpointStyleIntegration(unittest.TestCase):
         mock_selector.return_value.predict.assert_not_called()
 
 
+
+class TestExtractDigestFeatures(unittest.TestCase):
+    """対局単位キャッシュの特徴量が呼び出し側と共有されないこと."""
+
+    def test_mutating_result_does_not_touch_cache(self) -> None:
+        moves = ["7g7f", "3c3d", "2g2f", "8c8d"]
+        first = _extract_digest_features(moves, max_samples=4)
+        first[0]["king_safety"] = -1
+        first[-1]["after"].clear()
+        second = _extract_digest_features(moves, max_samples=4)
+        self.assertNotEqual(second[0]["king_safety"], -1)
+        self.assertTrue(second[-1]["after"])
+
+
 if __name__ == "__main__":
     unittest.main()
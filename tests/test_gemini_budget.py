@@ -0,0 +1,39 @@
+"""Tests for the client-side Gemini request budget in ai_service."""
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+from backend.api.services.ai_service import _TokenBucket
+
+
+def _at(t):
+    return patch("backend.api.services.ai_service.time.monotonic", return_value=t)
+
+
+class TestTokenBucket:
+    def test_disabled_when_rate_is_zero(self):
+        b = _TokenBucket(rate_per_min=0, max_wait_sec=0)
+        assert all(asyncio.run(b.acquire()) == 0.0 for _ in range(100))
+
+    def test_over_budget_returns_wait_without_taking_token(self):
+        with _at(1000.0):
+            b = _TokenBucket(rate_per_min=2, max_wait_sec=0)
+            assert asyncio.run(b.acquire()) == 0.0
+            assert asyncio.run(b.acquire()) == 0.0
+            assert asyncio.run(b.acquire()) == 30.0  # 2/min -> 1 token per 30s
+            assert asyncio.run(b.acquire()) == 30.0  # 拒否分は枠を消費しない
+        with _at(1030.0):
+            assert asyncio.run(b.acquire()) == 0.0
+
+    def test_short_wait_sleeps_then_takes_token(self):
+        b = _TokenBucket(rate_per_min=600, max_wait_sec=1.0)  # 0.1s per token
+        b._tokens = 0.0
+        slept = []
+
+        async def fake_sleep(sec):
+            slept.append(sec)
+
+        with _at(b._updated), patch("backend.api.services.ai_service.asyncio.sleep", fake_sleep):
+            assert asyncio.run(b.acquire()) == 0.0
+        assert slept == [0.1]
@@ -5,6 +5,7 @@ import pytest
 
 from backend.api.services.position_features import (
     extract_position_features,
+    extract_position_features_from_board,
     _king_safety,
     _piece_activity,
     _attack_pressure,
@@ -236,3 +237,10 @@ class TestExtractPositionFeatures:
         """終盤局面の判定."""
         result = extract_position_features(ENDGAME_SFEN, ply=80)
         assert result["phase"] == "endgame"
+
+    def test_from_board_matches_position_cmd(self):
+        """盤面版は position コマンド版と同じ結果を返す."""
+        pos = parse_position_cmd(YAGURA_MOVES)
+        expected = extract_position_features(YAGURA_MOVES, move="2g2f", ply=20)
+        result = extract_position_features_from_board(pos.board, pos.turn, move="2g2f", ply=20)
+        assert result == expected
@@ -0,0 +1,172 @@
+"""Tests for the per-IP rate-limit middleware."""
+from __future__ import annotations
+
+import asyncio
+import os
+import unittest
+from unittest.mock import patch
+
+from backend.api.middleware.rate_limit import (
+    _NUM_SHARDS,
+    _REDIS_COOLDOWN_SEC,
+    _SHARD_MASK,
+    _WINDOW_SEC,
+    RateLimitMiddleware,
+    _Rule,
+    _Window,
+)
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def _middleware(**env: str) -> RateLimitMiddleware:
+    with patch.dict(os.environ, env):
+        return RateLimitMiddleware(app=None)
+
+
+class TestWindow(unittest.TestCase):
+
+    def test_advance_within_window_expires_passed_buckets(self) -> None:
+        w = _Window(100)
+        w.buckets[100 % _WINDOW_SEC] += 2
+        w.total += 2
+        w.advance(130)
+        w.buckets[130 % _WINDOW_SEC] += 1
+        w.total += 1
+        w.advance(159)
+        self.assertEqual(w.total, 3)
+        w.advance(160)  # second 100 leaves the window
+        self.assertEqual(w.total, 1)
+        self.assertEqual(w.buckets[100 % _WINDOW_SEC], 0)
+
+    def test_advance_past_whole_window_resets(self) -> None:
+        w = _Window(100)
+        w.buckets[100 % _WINDOW_SEC] += 5
+        w.total += 5
+        w.advance(100 + _WINDOW_SEC)
+        self.assertEqual(w.total, 0)
+        self.assertEqual(sum(w.buckets), 0)
+        self.assertEqual(w.last_second, 100 + _WINDOW_SEC)
+
+
+class TestHitLocal(unittest.TestCase):
+
+    def test_allows_up_to_limit_then_denies(self) -> None:
+        mw = _middleware()
+        rule = _Rule("/api/explain", "POST", 3)
+        results = [mw._hit_local("1.2.3.4", rule, 100)[0] for _ in range(4)]
+        self.assertEqual(results, [True, True, True, False])
+        # other clients have their own window
+        self.assertTrue(mw._hit_local("5.6.7.8", rule, 100)[0])
+
+    def test_retry_after_is_oldest_bucket_remaining_age(self) -> None:
+        mw = _middleware()
+        rule = _Rule("/api/explain", "POST", 2)
+        self.assertEqual(mw._hit_local("ip", rule, 100), (True, 0))
+        self.assertEqual(mw._hit_local("ip", rule, 110), (True, 0))
+        # oldest request (second 100) is 30 s old -> leaves the window in 30 s
+        self.assertEqual(mw._hit_local("ip", rule, 130), (False, 30))
+        # second 100 has expired; 110, 130 and this hit still exceed the limit,
+        # and the oldest remaining bucket (110) leaves in 10 s
+        self.assertEqual(mw._hit_local("ip", rule, 160), (False, 10))
+        self.assertTrue(mw._hit_local("ip", rule, 100 + 2 * _WINDOW_SEC)[0])
+
+    def test_lru_evicts_oldest_key_in_full_shard(self) -> None:
+        mw = _middleware(RATE_LIMIT_MAX_KEYS=str(2 * _NUM_SHARDS))
+        self.assertEqual(mw._max_keys_per_shard, 2)
+        rule = _Rule("/api/explain", "POST", 10)
+        # three client IPs whose keys land in the same shard
+        target = hash(("ip0", rule.prefix)) & _SHARD_MASK
+        ips = [ip for ip in (f"ip{i}" for i in range(100_000))
+               if hash((ip, rule.prefix)) & _SHARD_MASK == target][:3]
+        shard = mw._shards[target]
+        mw._hit_local(ips[0], rule, 100)
+        mw._hit_local(ips[1], rule, 100)
+        mw._hit_local(ips[0], rule, 101)  # ips[0] becomes most recently used
+        mw._hit_local(ips[2], rule, 102)
+        self.assertEqual(list(shard), [(ips[0], rule.prefix), (ips[2], rule.prefix)])
+
+    def test_gc_step_drops_keys_idle_for_a_window(self) -> None:
+        mw = _middleware()
+        rule = _Rule("/api/explain", "POST", 10)
+        mw._hit_local("old", rule, 100)
+        mw._hit_local("new", rule, 150)
+        for shard_no in range(_NUM_SHARDS):
+            mw._gc_cursor = shard_no
+            mw._gc_step(100 + _WINDOW_SEC)
+        keys = {k for shard in mw._shards for k in shard}
+        self.assertEqual(keys, {("new", rule.prefix)})
+
+
+class TestMatch(unittest.TestCase):
+
+    def test_longest_prefix_wins(self) -> None:
+        mw = _middleware(RATE_LIMIT_LLM_PER_MINUTE="10")
+        self.assertEqual(mw._match("/api/explain/digest", "POST").prefix, "/api/explain/digest")
+        self.assertEqual(mw._match("/api/explain", "POST").prefix, "/api/explain")
+        self.assertIsNone(mw._match("/api/explain", "GET"))
+        self.assertIsNone(mw._match("/health", "POST"))
+
+
+class _DownRedis:
+    """A Redis client whose every pipeline call fails."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def pipeline(self, transaction: bool = True):
+        self.calls += 1
+        raise ConnectionError("redis down")
+
+
+class TestRedisFallback(unittest.TestCase):
+
+    def test_failure_starts_cooldown(self) -> None:
+        mw = RateLimitMiddleware(app=None)
+        redis = mw._redis = _DownRedis()
+        rule = _Rule("/api/explain", "POST", 10)
+
+        self.assertIsNone(_run(mw._hit_redis("1.2.3.4", rule, 1000.0)))
+        self.assertIsNone(_run(mw._hit_redis("1.2.3.4", rule, 1001.0)))
+        self.assertEqual(redis.calls, 1)  # skipped during the cooldown
+
+        self.assertIsNone(_run(mw._hit_redis("1.2.3.4", rule, 1000.0 + _REDIS_COOLDOWN_SEC)))
+        self.assertEqual(redis.calls, 2)  # retried once the cooldown is over
+
+    def test_memory_limit_applies_when_redis_unavailable(self) -> None:
+        calls = []
+
+        async def app(scope, receive, send):
+            calls.append(scope["path"])
+
+        async def no_redis(ip, rule, now):
+            return None
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def scenario():
+            mw = _middleware(RATE_LIMIT_LLM_PER_MINUTE="2")
+            mw.app = app
+            mw._redis = object()
+            mw._hit_redis = no_redis
+            scope = {"type": "http", "method": "POST", "path": "/api/explain",
+                     "headers": [], "client": ("9.9.9.9", 1)}
+            for _ in range(3):
+                await mw(scope, None, send)
+
+        _run(scenario())
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(sent[0]["status"], 429)
+
+
+if __name__ == "__main__":
+    unittest.main()